@@ -1,5 +1,5 @@
 import numpy as np
-import random
+import os
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import time  
@@ -47,13 +47,14 @@ class PacketData:
         self.qos_value = None  # Placeholder for QoS value
 
 class RLScheduler:
-    def __init__(self, num_users, alpha=0.1, gamma=0.9, epsilon=0.1):
+    def __init__(self, num_users, alpha=0.1, gamma=0.9, epsilon=0.1, seed=None):
         self.num_users = num_users
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
         self.epsilon_decay = 0.995
         self.min_epsilon = 0.01
+        self.rng = np.random.default_rng(seed)  # Per-scheduler generator for reproducible runs
         self.q_table = np.zeros((num_users, num_users))  # Q-table for state-action values
         self.traffic_type_counts = {}  # Initialize traffic type counts
         self.traffic_type_counts_history = []  # To store counts over time
@@ -71,14 +72,14 @@ class RLScheduler:
         self.stats_history = []
 
     def choose_action(self, user_id):
-        if random.uniform(0, 1) < self.epsilon:
-            return random.randint(0, self.num_users - 1)
+        if self.rng.random() < self.epsilon:
+            return int(self.rng.integers(self.num_users))
         else:
             density_counts = {density: len(self.user_density_data[density]) for density in self.user_density_data}
             min_density = min(density_counts, key=density_counts.get)
             possible_users = [uid for uid in range(self.num_users) if USER_DENSITY_MAP[uid] == min_density]
             if possible_users:
-                return random.choice(possible_users)
+                return possible_users[self.rng.integers(len(possible_users))]
             else:
                 return np.argmax(self.q_table[user_id])
         
@@ -393,8 +394,11 @@ class CQIScheduler:
             "count": self.count
         }
 
+# Optional run seed (RUN_SEED) makes the RL scheduler's choices reproducible
+RUN_SEED = os.environ.get("RUN_SEED")
+
 # Instantiate the schedulers
-scheduler_rl = RLScheduler(num_users=20)
+scheduler_rl = RLScheduler(num_users=20, seed=int(RUN_SEED) if RUN_SEED is not None else None)
 scheduler_rr = RoundRobinScheduler(num_users=20)
 scheduler_cqi = CQIScheduler(num_users=20)
 
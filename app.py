@@ -1,119 +1,212 @@
 from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
-import asyncio
-import aiohttp
-import random
-import threading
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import math
+import os
 import time
 import uuid
 from qos_manager import QoSManager
+from traffic_engine import TrafficEngine
+from http_pool import HTTPClientPool
+from packet_generator import PacketBatchGenerator, TRAFFIC_TYPES, USER_DENSITIES, adjust_characteristics
+from packet_coalescer import PacketCoalescer
+from pacing import PacingScheduler, packet_rate_from_data_rate
+from traffic_models import ARRIVAL_MODELS
+from stream_runner import StreamRunner, DEFAULT_PACKET_RATE
+from generator_workers import GeneratorWorkerPool
+from traffic_trace import TraceRecorder
+from random_streams import RandomStreams
+from processor_cluster import ProcessorCluster
+from telemetry import TelemetryEmitter, SubscriptionRegistry, subscription_rooms
 
 app = Flask(__name__)
 socketio = SocketIO(app, async_mode="gevent")
 
-# Define traffic types, user densities, and traffic loads
-TRAFFIC_TYPES = {
-    "Instagram": {"data_rate": 10.0, "latency": 20.0},
-    "WhatsApp": {"data_rate": 1.0, "latency": 50.0},
-    "YouTube": {"data_rate": 50.0, "latency": 15.0},
-    "Voice Call": {"data_rate": 0.5, "latency": 10.0},
-    "Text Message": {"data_rate": 0.01, "latency": 100.0},
-    "Voice Message": {"data_rate": 5.0, "latency": 25.0},
-}
+# Run-level seed: every stream and the RL policy draw from generators spawned from it
+RUN_SEED = os.environ.get("RUN_SEED")
+random_streams = RandomStreams(int(RUN_SEED) if RUN_SEED is not None else None)
 
-# Initialize QoS Manager
-qos_manager = QoSManager()
-
-USER_DENSITIES = ["low", "medium", "high"]
+# Initialize QoS Manager; per-stream metrics are rolling ("window") or exponentially weighted ("ewma")
+QOS_METRICS_WINDOW = int(os.environ.get("QOS_METRICS_WINDOW", "1000"))
+QOS_METRICS_MODE = os.environ.get("QOS_METRICS_MODE", "window")
+# DRR mode weights each stream's quantum by traffic "priority" or by its "data_rate"
+QOS_DRR_WEIGHT = os.environ.get("QOS_DRR_WEIGHT", "priority")
+qos_manager = QoSManager(
+    rng=random_streams.spawn(),
+    metrics_window=QOS_METRICS_WINDOW,
+    metrics_mode=QOS_METRICS_MODE,
+    drr_weight=QOS_DRR_WEIGHT
+)
 
 # Store active tasks with their IDs
 active_tasks = {}
 
-def adjust_characteristics(characteristics, user_density):
-    if user_density == "medium":
-        characteristics["data_rate"] *= 0.75
-        characteristics["latency"] *= 1.25
-    elif user_density == "high":
-        characteristics["data_rate"] *= 0.5
-        characteristics["latency"] *= 1.5
-    return characteristics
+# Dashboards subscribe to rooms; only subscribed rooms get frames
+subscriptions = SubscriptionRegistry()
 
-def generate_mock_data(user_density, traffic_type, stream_id):
-    characteristics = TRAFFIC_TYPES[traffic_type].copy()
-    characteristics = adjust_characteristics(characteristics, user_density)
+# Per-packet status updates are coalesced per stream and emitted in batches
+telemetry = TelemetryEmitter(
+    socketio.emit,
+    window=float(os.environ.get("TELEMETRY_WINDOW", "0.25")),
+    max_pending=int(os.environ.get("TELEMETRY_MAX_PENDING", "10000")),
+    policy=os.environ.get("TELEMETRY_POLICY", "overwrite"),
+    subscriptions=subscriptions
+)
 
-    return {
-        "stream_id": stream_id,
-        "user_id": random.randint(0, 19),
-        "data_rate": characteristics["data_rate"],
-        "latency": characteristics["latency"],
-        "packet_loss": random.uniform(0.0, 5.0),
-        "traffic_load": random.choice(["light", "moderate", "heavy"]),
-        "traffic_type": traffic_type,
-        "cqi": random.uniform(0.1, 1.0)
-    }
+def stream_failed(stream_id, error):
+    # A crashed stream is dropped so /get_active_streams stops listing it
+    if active_tasks.pop(stream_id, None) is not None:
+        qos_manager.remove_stream(stream_id)
+        telemetry.publish("packet_status", {
+            "status": "exception",
+            "data": f"Stream stopped: {error}",
+            "stream_id": stream_id
+        })
+
+# Every stream coroutine runs on this shared engine instead of its own thread
+traffic_engine = TrafficEngine(
+    num_loops=int(os.environ.get("TRAFFIC_ENGINE_LOOPS", "1")),
+    on_stream_failed=stream_failed
+)
+
+# Keep-alive connection pool that all streams post through
+http_pool = HTTPClientPool(
+    limit=int(os.environ.get("HTTP_POOL_LIMIT", "100")),
+    limit_per_host=int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", "100"))
+)
+
+PROCESSOR_URL = "http://127.0.0.1:5432"
+
+# Optional cluster mode: comma-separated processor URLs, streams routed by consistent hashing
+PROCESSOR_URLS = [url.strip().rstrip("/") for url in os.environ.get("PROCESSOR_URLS", "").split(",") if url.strip()]
+processor_cluster = ProcessorCluster(PROCESSOR_URLS) if PROCESSOR_URLS else None
+
+# Opt-in: coalesce packets from all streams into /process_batch/ requests
+packet_coalescer = None
+if os.environ.get("PACKET_BATCH_MODE") == "1":
+    packet_coalescer = PacketCoalescer(
+        http_pool,
+        f"{PROCESSOR_URL}/process_batch/",
+        max_batch=int(os.environ.get("PACKET_BATCH_MAX_SIZE", "100")),
+        max_delay=float(os.environ.get("PACKET_BATCH_MAX_DELAY", "0.01"))
+    )
+
+# Vectorized packet synthesis over a precomputed characteristics table
+packet_generator = PacketBatchGenerator(
+    TRAFFIC_TYPES, USER_DENSITIES, adjust_characteristics, rng=random_streams.spawn()
+)
+
+PACKET_BATCH_SIZE = 64
+
+# Central timer wheel that paces every stream at its own packet rate
+pacing_scheduler = PacingScheduler()
+
+# Optional: record every generated packet for later replay (see traffic_trace.py)
+TRACE_RECORD_PATH = os.environ.get("TRACE_RECORD_PATH")
+trace_recorder = None
+
+stream_runner = StreamRunner(
+    qos_manager,
+    http_pool,
+    packet_generator,
+    PROCESSOR_URL,
+    telemetry.publish,
+    pacing_scheduler=pacing_scheduler,
+    packet_coalescer=packet_coalescer,
+    batch_size=PACKET_BATCH_SIZE,
+    # Open loop: fire sends on schedule without waiting for outstanding responses
+    open_loop=os.environ.get("OPEN_LOOP") == "1",
+    max_outstanding=int(os.environ.get("OPEN_LOOP_MAX_OUTSTANDING", "1000")),
+    processor_cluster=processor_cluster
+)
+
+LATENCY_EMIT_INTERVAL = 1.0  # seconds
 
-async def send_packets(user_density, traffic_type, stream_id):
-    async with aiohttp.ClientSession() as session:
-        while stream_id in active_tasks:
-            raw_data = generate_mock_data(user_density, traffic_type, stream_id)
-            
-            # Apply QoS management
-            processed_data = qos_manager.process_packet(stream_id, raw_data)
-            
-            try:
-                async with session.post("http://127.0.0.1:5432/process_packet/", json=processed_data) as response:
-                    if response.status == 200:
-                        # Get QoS metrics
-                        metrics = qos_manager.get_metrics(stream_id)
-                        
-                        socketio.emit("packet_status", {
-                            "status": "sent",
-                            "data": processed_data,
-                            "metrics": metrics,
-                            "stream_id": stream_id,
-                            "qos_mode": qos_manager.qos_mode
-                        })
-                    else:
-                        socketio.emit("packet_status", {
-                            "status": "error",
-                            "data": await response.text(),
-                            "stream_id": stream_id
-                        })
-            except Exception as e:
-                socketio.emit("packet_status", {
-                    "status": "exception",
-                    "data": str(e),
-                    "stream_id": stream_id
-                })
-            await asyncio.sleep(1)
+# Optional: shard streams across generator worker processes (started in __main__)
+GENERATOR_WORKERS = int(os.environ.get("GENERATOR_WORKERS", "0"))
+generator_workers = None
+
+def generate_mock_data(user_density, traffic_type, stream_id, rng=None):
+    return packet_generator.generate(user_density, traffic_type, stream_id, 1, rng=rng)[0]
+
+def _positive_number(value, name):
+    # JSON numbers or numeric strings; bools, NaN and infinities are rejected
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if isinstance(value, bool) or number is None or not math.isfinite(number) or number <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return number
+
+def get_packet_rate(user_density, traffic_type, packet_rate=None, packet_size=None):
+    # An explicit rate wins; otherwise derive it from the adjusted data rate.
+    # Raises ValueError for a rate or size that is not a positive number.
+    if packet_rate is not None:
+        return _positive_number(packet_rate, "packet_rate")
+    if packet_size is not None:
+        data_rate = packet_generator.characteristics[(traffic_type, user_density)]["data_rate"]
+        return packet_rate_from_data_rate(data_rate, _positive_number(packet_size, "packet_size"))
+    return DEFAULT_PACKET_RATE
+
+async def send_packets(user_density, traffic_type, stream_id, packet_rate=DEFAULT_PACKET_RATE, arrival_model=None,
+                       seed=None, packet_size=None):
+    await stream_runner.run(
+        user_density, traffic_type, stream_id, lambda: stream_id in active_tasks, packet_rate, arrival_model, seed,
+        packet_size
+    )
 
 @app.route("/add_traffic_stream", methods=["POST"])
 def add_traffic_stream():
     user_density = request.json.get("user_density")
     traffic_type = request.json.get("traffic_type")
+    if traffic_type not in TRAFFIC_TYPES:
+        return jsonify({"error": f"Unknown traffic type: {traffic_type}"}), 400
+    if user_density not in USER_DENSITIES:
+        return jsonify({"error": f"Unknown user density: {user_density}"}), 400
+    packet_size = request.json.get("packet_size")
+    try:
+        packet_rate = get_packet_rate(user_density, traffic_type, request.json.get("packet_rate"), packet_size)
+        if packet_size is not None:
+            # Packets are then sent at exactly this size (whole bytes)
+            packet_size = math.ceil(_positive_number(packet_size, "packet_size"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    arrival_model = request.json.get("arrival_model")
+    if arrival_model is not None and arrival_model not in ARRIVAL_MODELS:
+        return jsonify({"error": f"Unknown arrival model: {arrival_model}"}), 400
     
     stream_id = str(uuid.uuid4())
+    seed = random_streams.spawn_seed()
     
-    # Add stream to QoS manager
-    qos_manager.add_stream(stream_id, traffic_type, user_density)
-    
-    # Create new background task for this stream
     active_tasks[stream_id] = {
-        "thread": threading.Thread(
-            target=lambda: asyncio.run(send_packets(user_density, traffic_type, stream_id))
-        ),
         "traffic_type": traffic_type,
-        "user_density": user_density
+        "user_density": user_density,
+        "packet_rate": packet_rate,
+        "packet_size": packet_size,
+        "arrival_model": arrival_model
     }
     
-    active_tasks[stream_id]["thread"].start()
+    if generator_workers is not None:
+        # The owning worker keeps this stream's QoS state
+        generator_workers.add_stream(
+            stream_id, user_density, traffic_type, packet_rate, arrival_model, seed, packet_size
+        )
+    else:
+        # Add stream to QoS manager
+        qos_manager.add_stream(stream_id, traffic_type, user_density)
+        
+        # Schedule this stream as a task on the shared engine
+        traffic_engine.start_stream(
+            stream_id, send_packets, user_density, traffic_type, stream_id, packet_rate, arrival_model, seed,
+            packet_size
+        )
     
     return jsonify({
         "status": "stream_started",
         "stream_id": stream_id,
         "traffic_type": traffic_type,
-        "user_density": user_density
+        "user_density": user_density,
+        "packet_rate": packet_rate
     })
 
 @app.route("/remove_traffic_stream", methods=["POST"])
@@ -124,6 +217,10 @@ def remove_traffic_stream():
         # Remove stream from QoS manager
         qos_manager.remove_stream(stream_id)
         del active_tasks[stream_id]
+        if generator_workers is not None:
+            generator_workers.remove_stream(stream_id)
+        else:
+            traffic_engine.stop_stream(stream_id)
         return jsonify({"status": "stream_stopped", "stream_id": stream_id})
     else:
         return jsonify({"error": "Stream not found"}), 404
@@ -131,6 +228,8 @@ def remove_traffic_stream():
 @app.route("/switch_qos_mode", methods=["POST"])
 def switch_qos_mode():
     new_mode = qos_manager.switch_qos_mode()
+    if generator_workers is not None:
+        generator_workers.set_qos_mode(new_mode)
     return jsonify({"status": "success", "mode": new_mode})
 
 @app.route("/get_active_streams", methods=["GET"])
@@ -138,19 +237,110 @@ def get_active_streams():
     return jsonify({
         stream_id: {
             "traffic_type": info["traffic_type"],
-            "user_density": info["user_density"]
+            "user_density": info["user_density"],
+            "packet_rate": info["packet_rate"],
+            "packet_size": info["packet_size"],
+            "arrival_model": info["arrival_model"]
         }
         for stream_id, info in active_tasks.items()
     })
 
 @app.route("/stop_all_streams", methods=["POST"])
 def stop_all_streams():
+    # Stopped streams must also leave the RR/DRR rotation
+    for stream_id in list(active_tasks):
+        qos_manager.remove_stream(stream_id)
     active_tasks.clear()
+    if generator_workers is not None:
+        generator_workers.stop_all()
+    else:
+        traffic_engine.stop_all()
     return jsonify({"status": "all_streams_stopped"})
 
+def get_latency_snapshot():
+    if generator_workers is not None:
+        return generator_workers.latency_snapshot()
+    return stream_runner.latency_tracker.snapshot()
+
+def emit_latency_stats():
+    while True:
+        socketio.sleep(LATENCY_EMIT_INTERVAL)
+        if subscriptions.has_subscribers("aggregate:latency"):
+            socketio.emit("latency_stats", get_latency_snapshot(), to="aggregate:latency")
+
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    rooms = subscription_rooms(data or {})
+    for room in rooms:
+        join_room(room)
+        subscriptions.add(request.sid, room)
+    emit("subscribed", {"rooms": rooms})
+
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    rooms = subscription_rooms(data or {})
+    for room in rooms:
+        leave_room(room)
+        subscriptions.remove(request.sid, room)
+    emit("unsubscribed", {"rooms": rooms})
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    subscriptions.remove_client(request.sid)
+
+@app.route("/latency_stats", methods=["GET"])
+def get_latency_stats():
+    return jsonify(get_latency_snapshot())
+
+@app.route("/processor_cluster", methods=["GET"])
+def get_processor_cluster():
+    if processor_cluster is None:
+        return jsonify({"mode": "single", "processor_url": PROCESSOR_URL})
+    return jsonify({"mode": "cluster", "processors": processor_cluster.get_status()})
+
+@app.route("/http_pool_metrics", methods=["GET"])
+def get_http_pool_metrics():
+    return jsonify(http_pool.get_metrics())
+
 @app.route("/")
 def index():
     return render_template("index.html", traffic_types=TRAFFIC_TYPES.keys(), user_densities=USER_DENSITIES)
 
 if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=5006)
\ No newline at end of file
+    if TRACE_RECORD_PATH and GENERATOR_WORKERS == 0:
+        trace_recorder = TraceRecorder(TRACE_RECORD_PATH)
+        stream_runner.recorder = trace_recorder
+    if GENERATOR_WORKERS > 0:
+        # Started here rather than at import: spawned workers re-import this module
+        generator_workers = GeneratorWorkerPool(
+            GENERATOR_WORKERS,
+            {
+                "processor_url": PROCESSOR_URL,
+                "processor_urls": PROCESSOR_URLS,
+                "http_pool_limit": http_pool.limit,
+                "http_pool_limit_per_host": http_pool.limit_per_host,
+                "batch_mode": packet_coalescer is not None,
+                "batch_max_size": packet_coalescer.max_batch if packet_coalescer is not None else None,
+                "batch_max_delay": packet_coalescer.max_delay if packet_coalescer is not None else None,
+                "packet_batch_size": PACKET_BATCH_SIZE,
+                "qos_mode": qos_manager.qos_mode,
+                "metrics_window": QOS_METRICS_WINDOW,
+                "metrics_mode": QOS_METRICS_MODE,
+                "drr_weight": QOS_DRR_WEIGHT,
+                "trace_path": TRACE_RECORD_PATH,
+                "open_loop": stream_runner.open_loop,
+                "max_outstanding": stream_runner.max_outstanding,
+                "telemetry_max_pending": telemetry.max_pending,
+                "telemetry_policy": telemetry.policy
+            },
+            telemetry,
+            random_streams,
+            on_stream_failed=stream_failed
+        )
+    socketio.start_background_task(telemetry.run, socketio.sleep)
+    socketio.start_background_task(emit_latency_stats)
+    try:
+        socketio.run(app, host="0.0.0.0", port=5006)
+    finally:
+        if trace_recorder is not None:
+            trace_recorder.close()
\ No newline at end of file
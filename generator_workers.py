@@ -0,0 +1,276 @@
+# generator_workers.py
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import zlib
+
+import numpy as np
+
+from http_pool import HTTPClientPool
+from latency_histogram import LatencyHistogram
+from packet_coalescer import PacketCoalescer
+from packet_generator import PacketBatchGenerator
+from processor_cluster import ProcessorCluster
+from qos_manager import QoSManager
+from stream_runner import StreamRunner
+from telemetry import TelemetryEmitter
+from traffic_trace import TraceRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class _GeneratorWorker:
+    def __init__(self, worker_id, config, command_queue, event_queue, seed=None):
+        self.worker_id = worker_id
+        self.config = config
+        self.command_queue = command_queue
+        self.event_queue = event_queue
+        self.streams = {}
+        # Frames to ship to the control process; status updates are
+        # coalesced per stream first, so this stays bounded per interval
+        self.outbox = []
+        self.telemetry = TelemetryEmitter(
+            self._emit_frame,
+            max_pending=config.get('telemetry_max_pending', 10000),
+            policy=config.get('telemetry_policy', 'overwrite')
+        )
+
+        self.qos_manager = QoSManager(
+            rng=np.random.default_rng(seed),
+            metrics_window=config.get('metrics_window', 1000),
+            metrics_mode=config.get('metrics_mode', 'window'),
+            drr_weight=config.get('drr_weight', 'priority')
+        )
+        self.qos_manager.qos_mode = config.get('qos_mode', 'RL')
+        self.http_pool = HTTPClientPool(
+            limit=config.get('http_pool_limit', 100),
+            limit_per_host=config.get('http_pool_limit_per_host', 100)
+        )
+        packet_coalescer = None
+        if config.get('batch_mode'):
+            packet_coalescer = PacketCoalescer(
+                self.http_pool,
+                f"{config['processor_url']}/process_batch/",
+                max_batch=config.get('batch_max_size', 100),
+                max_delay=config.get('batch_max_delay', 0.01)
+            )
+        processor_cluster = None
+        if config.get('processor_urls'):
+            processor_cluster = ProcessorCluster(config['processor_urls'])
+        # Each worker appends to its own trace file; replay merges them by time
+        self.recorder = None
+        if config.get('trace_path'):
+            self.recorder = TraceRecorder(f"{config['trace_path']}.{worker_id}")
+        self.runner = StreamRunner(
+            self.qos_manager,
+            self.http_pool,
+            PacketBatchGenerator(),
+            config['processor_url'],
+            self.publish,
+            packet_coalescer=packet_coalescer,
+            batch_size=config.get('packet_batch_size', 64),
+            recorder=self.recorder,
+            open_loop=config.get('open_loop', False),
+            max_outstanding=config.get('max_outstanding', 1000),
+            processor_cluster=processor_cluster
+        )
+
+    def publish(self, event, payload):
+        self.telemetry.publish(event, payload)
+
+    def _emit_frame(self, event, frame):
+        self.outbox.append((event, frame))
+
+    def _flush_events(self):
+        self.telemetry.flush()
+        if self.outbox:
+            self.event_queue.put(self.outbox)
+            self.outbox = []
+
+    def _publish_latency(self):
+        tracker = self.runner.latency_tracker
+        self.outbox.append(('latency_stats', {
+            'worker_id': self.worker_id,
+            'streams': tracker.snapshot()['streams'],
+            # Raw histograms so the control process can merge across workers
+            'traffic_types': {
+                traffic_type: histogram.to_sparse()
+                for traffic_type, histogram in tracker.traffic_type_histograms().items()
+            }
+        }))
+
+    async def _event_flusher(self):
+        # Ship coalesced status frames to the control process in one message per interval
+        loop = asyncio.get_running_loop()
+        latency_interval = self.config.get('latency_interval', 1.0)
+        last_latency = loop.time()
+        while True:
+            await asyncio.sleep(self.config.get('event_interval', 0.1))
+            if loop.time() - last_latency >= latency_interval:
+                self._publish_latency()
+                last_latency = loop.time()
+            self._flush_events()
+
+    def _add_stream(self, loop, stream_id, user_density, traffic_type, packet_rate, arrival_model, seed, packet_size):
+        self.qos_manager.add_stream(stream_id, traffic_type, user_density)
+        task = self.streams[stream_id] = loop.create_task(self.runner.run(
+            user_density,
+            traffic_type,
+            stream_id,
+            lambda: stream_id in self.streams,
+            packet_rate,
+            arrival_model,
+            seed,
+            packet_size
+        ))
+        task.add_done_callback(lambda t: self._forget(stream_id, t))
+
+    def _forget(self, stream_id, task):
+        # A newer task may have been registered under the same id
+        if self.streams.get(stream_id) is task:
+            del self.streams[stream_id]
+            self.qos_manager.remove_stream(stream_id)
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        logger.error(f"Stream {stream_id} failed", exc_info=error)
+        # Sent right away rather than with the next batch of frames
+        self.event_queue.put([('stream_failed', {'stream_id': stream_id, 'error': str(error)})])
+
+    def _remove_stream(self, stream_id):
+        task = self.streams.pop(stream_id, None)
+        if task is not None:
+            task.cancel()
+        self.qos_manager.remove_stream(stream_id)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        flusher = loop.create_task(self._event_flusher())
+        while True:
+            command, *args = await loop.run_in_executor(None, self.command_queue.get)
+            if command == 'add':
+                self._add_stream(loop, *args)
+            elif command == 'remove':
+                self._remove_stream(*args)
+            elif command == 'stop_all':
+                for stream_id in list(self.streams):
+                    self._remove_stream(stream_id)
+            elif command == 'qos_mode':
+                self.qos_manager.qos_mode = args[0]
+            elif command == 'shutdown':
+                break
+
+        for stream_id in list(self.streams):
+            self._remove_stream(stream_id)
+        flusher.cancel()
+        self._flush_events()
+        await self.http_pool.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+def _worker_main(worker_id, config, command_queue, event_queue, seed):
+    asyncio.run(_GeneratorWorker(worker_id, config, command_queue, event_queue, seed).run())
+
+
+class GeneratorWorkerPool:
+    """Shards streams across worker processes by stream id hash.
+
+    Each worker runs its own event loop, QoSManager and HTTP pool, and
+    coalesces its status updates per stream in its own TelemetryEmitter.
+    Workers send one list of frames per interval back over a single queue,
+    and a listener thread in the control process folds them into telemetry
+    (the control process's TelemetryEmitter).
+    """
+
+    def __init__(self, num_workers, config, telemetry, random_streams=None, on_stream_failed=None):
+        self.telemetry = telemetry
+        self.on_stream_failed = on_stream_failed
+        self.latency_stats = {}
+        context = multiprocessing.get_context('spawn')
+        self.event_queue = context.Queue()
+        self.command_queues = [context.Queue() for _ in range(num_workers)]
+        self.processes = [
+            context.Process(
+                target=_worker_main,
+                args=(
+                    worker_id,
+                    config,
+                    command_queue,
+                    self.event_queue,
+                    random_streams.spawn_seed() if random_streams is not None else None
+                ),
+                name=f"generator-worker-{worker_id}",
+                daemon=True
+            )
+            for worker_id, command_queue in enumerate(self.command_queues)
+        ]
+        for process in self.processes:
+            process.start()
+        self.listener = threading.Thread(target=self._listen, name="generator-events", daemon=True)
+        self.listener.start()
+
+    def _listen(self):
+        while True:
+            events = self.event_queue.get()
+            if events is None:
+                break
+            for event, frame in events:
+                if event == 'latency_stats':
+                    self.latency_stats[frame['worker_id']] = frame
+                elif event == 'stream_failed':
+                    if self.on_stream_failed is not None:
+                        self.on_stream_failed(frame['stream_id'], frame['error'])
+                elif event == 'telemetry_dropped':
+                    self.telemetry.add_dropped(frame['dropped'])
+                else:
+                    # '<event>_batch' frames of already coalesced updates
+                    self.telemetry.add_dropped(frame['dropped'])
+                    for update in frame['updates']:
+                        self.telemetry.publish(event[:-len('_batch')], update, update.pop('coalesced'))
+
+    def latency_snapshot(self):
+        streams = {}
+        traffic_types = {}
+        for stats in list(self.latency_stats.values()):
+            streams.update(stats['streams'])
+            for traffic_type, sparse in stats['traffic_types'].items():
+                histogram = LatencyHistogram.from_sparse(sparse)
+                if traffic_type in traffic_types:
+                    traffic_types[traffic_type].merge(histogram)
+                else:
+                    traffic_types[traffic_type] = histogram
+        return {
+            'streams': streams,
+            'traffic_types': {traffic_type: histogram.summary() for traffic_type, histogram in traffic_types.items()}
+        }
+
+    def _queue_for(self, stream_id):
+        return self.command_queues[zlib.crc32(stream_id.encode()) % len(self.command_queues)]
+
+    def add_stream(self, stream_id, user_density, traffic_type, packet_rate, arrival_model=None, seed=None,
+                   packet_size=None):
+        self._queue_for(stream_id).put(
+            ('add', stream_id, user_density, traffic_type, packet_rate, arrival_model, seed, packet_size)
+        )
+
+    def remove_stream(self, stream_id):
+        self._queue_for(stream_id).put(('remove', stream_id))
+
+    def stop_all(self):
+        for command_queue in self.command_queues:
+            command_queue.put(('stop_all',))
+
+    def set_qos_mode(self, qos_mode):
+        for command_queue in self.command_queues:
+            command_queue.put(('qos_mode', qos_mode))
+
+    def shutdown(self):
+        for command_queue in self.command_queues:
+            command_queue.put(('shutdown',))
+        for process in self.processes:
+            process.join()
+        self.event_queue.put(None)
+        self.listener.join()
@@ -0,0 +1,128 @@
+# http_pool.py
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.total_requests = 0
+        self.failed_requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued_requests = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def add(self, name, value=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def record_wait(self, wait_time):
+        with self.lock:
+            self.queued_requests += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def snapshot(self):
+        with self.lock:
+            acquired = self.connections_created + self.connections_reused
+            return {
+                'in_flight': self.in_flight,
+                'total_requests': self.total_requests,
+                'failed_requests': self.failed_requests,
+                'connections_created': self.connections_created,
+                'connections_reused': self.connections_reused,
+                'reuse_ratio': self.connections_reused / acquired if acquired else 0,
+                'queued_requests': self.queued_requests,
+                'avg_wait_time': self.total_wait_time / self.queued_requests if self.queued_requests else 0,
+                'max_wait_time': self.max_wait_time
+            }
+
+
+class HTTPClientPool:
+    """Keep-alive HTTP client shared by every stream.
+
+    aiohttp sessions are bound to the loop that created them, so one session
+    (and one bounded connector) is kept per event loop; all of them report
+    into the same metrics.
+    """
+
+    def __init__(self, limit=100, limit_per_host=100, keepalive_timeout=30, timeout=5):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.metrics = PoolMetrics()
+        self.sessions = {}
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_queued_start(session, ctx, params):
+            ctx.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, ctx, params):
+            self.metrics.record_wait(time.perf_counter() - ctx.queued_at)
+
+        async def on_create_end(session, ctx, params):
+            self.metrics.add('connections_created')
+
+        async def on_reuse(session, ctx, params):
+            self.metrics.add('connections_reused')
+
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()]
+            )
+            self.sessions[loop] = session
+        return session
+
+    @asynccontextmanager
+    async def post(self, url, **kwargs):
+        session = self.get_session()
+        self.metrics.add('in_flight')
+        self.metrics.add('total_requests')
+        try:
+            async with session.post(url, **kwargs) as response:
+                yield response
+        except Exception:
+            self.metrics.add('failed_requests')
+            raise
+        finally:
+            self.metrics.add('in_flight', -1)
+
+    async def close(self):
+        # Must be awaited on the loop that owns the session
+        session = self.sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def get_metrics(self):
+        metrics = self.metrics.snapshot()
+        metrics['sessions'] = len(self.sessions)
+        metrics['limit'] = self.limit
+        metrics['limit_per_host'] = self.limit_per_host
+        return metrics
@@ -0,0 +1,174 @@
+# latency_histogram.py
+
+import math
+import threading
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in microseconds.
+
+    Values keep `significant_digits` of precision across the whole range:
+    each power-of-two bucket is split into the same number of linear
+    sub-buckets. Counts live in one fixed NumPy array, so memory does not
+    grow with the number of samples and two histograms with the same
+    settings merge by adding their counts. The array starts as uint32 and is
+    widened to int64 only once the total count could overflow it.
+    """
+
+    def __init__(self, max_value_us=60_000_000, significant_digits=2):
+        largest_single_unit = 2 * 10 ** significant_digits
+        self.sub_bucket_half_magnitude = int(np.ceil(np.log2(largest_single_unit))) - 1
+        self.sub_bucket_half_count = 1 << self.sub_bucket_half_magnitude
+        self.sub_bucket_mask = (self.sub_bucket_half_count << 1) - 1
+        self.max_value_us = max_value_us
+        self.significant_digits = significant_digits
+        self.counts = np.zeros(self._index_for(max_value_us) + 1, dtype=np.uint32)
+        self.total_count = 0
+        self.total_value = 0
+        self.max_recorded = 0
+        self.cached_summary = None
+
+    def _index_for(self, value):
+        bucket_index = (value | self.sub_bucket_mask).bit_length() - (self.sub_bucket_half_magnitude + 1)
+        sub_bucket_index = value >> bucket_index
+        return ((bucket_index + 1) << self.sub_bucket_half_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+
+    def _value_for(self, index):
+        bucket_index = (index >> self.sub_bucket_half_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        # Report the highest value that falls into this slot
+        return ((sub_bucket_index + 1) << bucket_index) - 1
+
+    def _reserve(self, count):
+        # No single slot can hold more than total_count
+        if self.counts.dtype == np.uint32 and self.total_count + count > np.iinfo(np.uint32).max:
+            self.counts = self.counts.astype(np.int64)
+
+    def record(self, value_us, count=1):
+        value_us = min(max(int(value_us), 0), self.max_value_us)
+        self._reserve(count)
+        self.cached_summary = None
+        self.counts[self._index_for(value_us)] += count
+        self.total_count += count
+        self.total_value += value_us * count
+        self.max_recorded = max(self.max_recorded, value_us)
+
+    def record_seconds(self, seconds):
+        self.record(seconds * 1_000_000)
+
+    def merge(self, other):
+        self._reserve(other.total_count)
+        self.cached_summary = None
+        self.counts += other.counts
+        self.total_count += other.total_count
+        self.total_value += other.total_value
+        self.max_recorded = max(self.max_recorded, other.max_recorded)
+        return self
+
+    def values_at_percentiles(self, percentiles):
+        # One cumulative sum serves every percentile; slots above the largest
+        # recorded value are empty and skipped
+        if self.total_count == 0:
+            return [0] * len(percentiles)
+        targets = [max(1, math.ceil(percentile / 100 * self.total_count)) for percentile in percentiles]
+        cumulative = self.counts[:self._index_for(self.max_recorded) + 1].cumsum(dtype=np.int64)
+        indexes = cumulative.searchsorted(targets).tolist()
+        return [min(self._value_for(index), self.max_recorded) for index in indexes]
+
+    def value_at_percentile(self, percentile):
+        return self.values_at_percentiles([percentile])[0]
+
+    def summary(self):
+        # Percentiles in milliseconds, kept until the next record or merge
+        if self.cached_summary is None:
+            p50, p99, p999 = self.values_at_percentiles([50, 99, 99.9])
+            self.cached_summary = {
+                'count': self.total_count,
+                'mean': self.total_value / self.total_count / 1000 if self.total_count else 0,
+                'p50': p50 / 1000,
+                'p99': p99 / 1000,
+                'p99.9': p999 / 1000,
+                'max': self.max_recorded / 1000
+            }
+        return dict(self.cached_summary)
+
+    def to_sparse(self):
+        # Compact form for shipping between processes
+        indexes = np.flatnonzero(self.counts)
+        return {
+            'indexes': indexes.tolist(),
+            'counts': self.counts[indexes].tolist(),
+            'total_value': self.total_value,
+            'max': self.max_recorded
+        }
+
+    @classmethod
+    def from_sparse(cls, data, **kwargs):
+        histogram = cls(**kwargs)
+        histogram._reserve(sum(data['counts']))
+        histogram.counts[data['indexes']] = data['counts']
+        histogram.total_count = int(sum(data['counts']))
+        histogram.total_value = data['total_value']
+        histogram.max_recorded = data['max']
+        return histogram
+
+
+class LatencyTracker:
+    """Per-stream latency histograms, aggregated per traffic type on read.
+
+    Histograms of removed streams are folded into their traffic type so the
+    aggregate keeps covering the whole run. Every engine loop thread and the
+    web thread share one tracker, so all access goes through a lock.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.retired = {}
+        self.lock = threading.RLock()
+
+    def record(self, stream_id, traffic_type, seconds):
+        with self.lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                entry = self.streams[stream_id] = (traffic_type, LatencyHistogram())
+            entry[1].record_seconds(seconds)
+
+    def remove(self, stream_id):
+        with self.lock:
+            entry = self.streams.pop(stream_id, None)
+            if entry is not None:
+                traffic_type, histogram = entry
+                if traffic_type in self.retired:
+                    self.retired[traffic_type].merge(histogram)
+                else:
+                    self.retired[traffic_type] = histogram
+
+    def stream_summary(self, stream_id):
+        with self.lock:
+            entry = self.streams.get(stream_id)
+            return entry[1].summary() if entry is not None else None
+
+    def traffic_type_histograms(self):
+        # Fresh histograms, safe to use after the lock is released
+        merged = {}
+        with self.lock:
+            for traffic_type, histogram in list(self.retired.items()) + list(self.streams.values()):
+                if traffic_type not in merged:
+                    merged[traffic_type] = LatencyHistogram()
+                merged[traffic_type].merge(histogram)
+        return merged
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'streams': {stream_id: histogram.summary() for stream_id, (_, histogram) in self.streams.items()},
+                'traffic_types': {
+                    traffic_type: histogram.summary()
+                    for traffic_type, histogram in self.traffic_type_histograms().items()
+                }
+            }
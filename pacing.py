@@ -0,0 +1,126 @@
+# pacing.py
+
+import asyncio
+import math
+
+
+class TimerWheel:
+    """Hashed timer wheel driving every paced stream on one event loop.
+
+    Scheduling drops a future into slot (tick % slots), which is O(1); a single
+    runner task advances one tick at a time and only touches the entries of
+    the current slot. Deadlines further out than one revolution simply stay in
+    their slot until their tick comes round.
+    """
+
+    def __init__(self, loop, tick=0.001, slots=1024):
+        self.loop = loop
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.origin = loop.time()
+        self.current_tick = 0
+        self.pending = 0
+        self.runner = None
+
+    def _tick_at(self, when):
+        return int((when - self.origin) / self.tick)
+
+    def schedule(self, deadline):
+        if self.runner is None:
+            # Idle wheel: jump straight to the present instead of replaying ticks
+            self.current_tick = self._tick_at(self.loop.time())
+            self.runner = self.loop.create_task(self._run())
+
+        target_tick = max(self.current_tick + 1, math.ceil((deadline - self.origin) / self.tick))
+        future = self.loop.create_future()
+        self.slots[target_tick % len(self.slots)].append((target_tick, future))
+        self.pending += 1
+        return future
+
+    def _expire(self, tick):
+        slot = self.slots[tick % len(self.slots)]
+        if not slot:
+            return
+        remaining = []
+        for target_tick, future in slot:
+            if target_tick > tick:
+                remaining.append((target_tick, future))
+                continue
+            self.pending -= 1
+            if not future.done():
+                future.set_result(None)
+        slot[:] = remaining
+
+    async def _run(self):
+        try:
+            while self.pending:
+                now_tick = self._tick_at(self.loop.time())
+                while self.current_tick < now_tick:
+                    self.current_tick += 1
+                    self._expire(self.current_tick)
+                # Sleep to the next tick boundary, not for a fixed duration, so ticks don't drift
+                next_boundary = self.origin + (self.current_tick + 1) * self.tick
+                await asyncio.sleep(max(0, next_boundary - self.loop.time()))
+        finally:
+            self.runner = None
+
+
+class StreamPacer:
+    """Paces one stream against absolute deadlines.
+
+    Deadlines advance by exactly one interval per packet (fixed, or drawn from
+    an arrival model), so time spent generating and posting is absorbed
+    instead of adding up as drift. A stream that falls behind releases its
+    missed packets back to back, each with its own intended send time, so
+    latency measured from those times includes the stall (no coordinated
+    omission). Setting max_lag re-anchors the schedule at the current time
+    once the stream is more than max_lag mean intervals behind; the skipped
+    packets are then never sent or measured.
+    """
+
+    def __init__(self, scheduler, packet_rate, max_lag=None, intervals=None):
+        self.scheduler = scheduler
+        self.interval = 1.0 / packet_rate
+        self.max_lag = max_lag
+        self.intervals = intervals
+        self.next_deadline = None
+
+    async def wait(self):
+        # Returns the intended send time (loop clock) of the packet being released
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_deadline is None:
+            self.next_deadline = now
+            return now
+        self.next_deadline += next(self.intervals) if self.intervals is not None else self.interval
+        if self.max_lag is not None and self.next_deadline < now - self.interval * self.max_lag:
+            self.next_deadline = now
+        if self.next_deadline > now:
+            await self.scheduler.wait_until(self.next_deadline)
+        return self.next_deadline
+
+
+class PacingScheduler:
+    def __init__(self, tick=0.001, slots=1024):
+        self.tick = tick
+        self.slots = slots
+        self.wheels = {}
+
+    def get_wheel(self):
+        loop = asyncio.get_running_loop()
+        wheel = self.wheels.get(loop)
+        if wheel is None:
+            wheel = self.wheels[loop] = TimerWheel(loop, self.tick, self.slots)
+        return wheel
+
+    async def wait_until(self, deadline):
+        await self.get_wheel().schedule(deadline)
+
+    def stream_pacer(self, packet_rate, arrival_model=None, max_lag=None):
+        intervals = arrival_model.intervals() if arrival_model is not None else None
+        return StreamPacer(self, packet_rate, max_lag=max_lag, intervals=intervals)
+
+
+def packet_rate_from_data_rate(data_rate, packet_size):
+    # data_rate is in Mbps, packet_size in bytes
+    return data_rate * 1_000_000 / 8 / packet_size
@@ -0,0 +1,90 @@
+# packet_coalescer.py
+
+import asyncio
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.entries = []
+        self.timer = None
+
+
+class PacketCoalescer:
+    """Collects packets from many streams and posts them to /process_batch/.
+
+    A batch is flushed once it holds max_batch packets or max_delay seconds
+    after its first packet, whichever comes first. Each submit() resolves to
+    that packet's own result once the batch response arrives. Packets bound
+    for different processors (see submit's url) are batched separately.
+    """
+
+    def __init__(self, http_pool, url, max_batch=100, max_delay=0.01):
+        self.http_pool = http_pool
+        self.url = url
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = {}
+
+    async def submit(self, packet, url=None):
+        loop = asyncio.get_running_loop()
+        key = (loop, url or self.url)
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = _PendingBatch()
+
+        future = loop.create_future()
+        batch.entries.append((packet, future))
+
+        if len(batch.entries) >= self.max_batch:
+            self._flush(key)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(self.max_delay, self._flush, key)
+
+        return await future
+
+    def _flush(self, key):
+        batch = self.pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        loop, url = key
+        loop.create_task(self._send(url, batch.entries))
+
+    async def _send(self, url, entries):
+        packets = [packet for packet, _ in entries]
+        try:
+            async with self.http_pool.post(url, json=packets) as response:
+                if response.status != 200:
+                    error = await response.text()
+                    results = [{'error': error}] * len(entries)
+                else:
+                    results = self._split_results(packets, await response.json())
+        except Exception as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _split_results(self, packets, response):
+        # Expand the compact per-stream [first, count] ranges back to packets
+        next_number = {stream_id: first for stream_id, (first, _) in response['streams'].items()}
+        rejected = set(response['rejected'])
+        results = []
+        for index, packet in enumerate(packets):
+            if index in rejected:
+                results.append({'error': 'Missing stream_id'})
+                continue
+            stream_id = packet['stream_id']
+            results.append({
+                'status': 'success',
+                'processed_at': response.get('processed_at', response.get('processed_at_ns')),
+                'stream_id': stream_id,
+                'packet_number': next_number[stream_id]
+            })
+            next_number[stream_id] += 1
+        return results
@@ -0,0 +1,102 @@
+# packet_generator.py
+
+import numpy as np
+
+# Define traffic types, user densities, and traffic loads
+TRAFFIC_TYPES = {
+    "Instagram": {"data_rate": 10.0, "latency": 20.0},
+    "WhatsApp": {"data_rate": 1.0, "latency": 50.0},
+    "YouTube": {"data_rate": 50.0, "latency": 15.0},
+    "Voice Call": {"data_rate": 0.5, "latency": 10.0},
+    "Text Message": {"data_rate": 0.01, "latency": 100.0},
+    "Voice Message": {"data_rate": 5.0, "latency": 25.0},
+}
+
+USER_DENSITIES = ["low", "medium", "high"]
+
+TRAFFIC_LOADS = ["light", "moderate", "heavy"]
+
+
+def adjust_characteristics(characteristics, user_density):
+    if user_density == "medium":
+        characteristics["data_rate"] *= 0.75
+        characteristics["latency"] *= 1.25
+    elif user_density == "high":
+        characteristics["data_rate"] *= 0.5
+        characteristics["latency"] *= 1.5
+    return characteristics
+
+
+class PacketBatch:
+    """Columnar block of generated packets for a single stream.
+
+    Random fields are kept as NumPy arrays; per-packet dicts are only built
+    when the batch is indexed or iterated.
+    """
+
+    def __init__(self, stream_id, traffic_type, characteristics, columns):
+        self.stream_id = stream_id
+        self.traffic_type = traffic_type
+        self.characteristics = characteristics
+        self.columns = columns
+        self._lists = None
+
+    def __len__(self):
+        return len(self.columns['user_id'])
+
+    def _as_lists(self):
+        # Convert once so the dicts carry plain Python (JSON-serializable) values
+        if self._lists is None:
+            self._lists = {name: column.tolist() for name, column in self.columns.items()}
+        return self._lists
+
+    def __getitem__(self, index):
+        columns = self._as_lists()
+        packet = {
+            "stream_id": self.stream_id,
+            "user_id": columns['user_id'][index],
+            "data_rate": self.characteristics["data_rate"],
+            "latency": self.characteristics["latency"],
+            "packet_loss": columns['packet_loss'][index],
+            "traffic_load": TRAFFIC_LOADS[columns['traffic_load'][index]],
+            "traffic_type": self.traffic_type,
+            "cqi": columns['cqi'][index]
+        }
+        if 'packet_size' in columns:
+            packet["packet_size"] = columns['packet_size'][index]
+        return packet
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class PacketBatchGenerator:
+    def __init__(self, traffic_types=TRAFFIC_TYPES, user_densities=USER_DENSITIES,
+                 adjust_characteristics=adjust_characteristics, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Precompute characteristics for every (traffic_type, user_density) pair
+        self.characteristics = {
+            (traffic_type, user_density): adjust_characteristics(base.copy(), user_density)
+            for traffic_type, base in traffic_types.items()
+            for user_density in user_densities
+        }
+
+    def generate(self, user_density, traffic_type, stream_id, n, size_model=None, rng=None):
+        # Streams pass their own generator; the shared one is only a fallback
+        rng = rng if rng is not None else self.rng
+        characteristics = self.characteristics[(traffic_type, user_density)]
+        columns = {
+            'user_id': rng.integers(0, 20, size=n),
+            'packet_loss': rng.uniform(0.0, 5.0, size=n),
+            'traffic_load': rng.integers(0, len(TRAFFIC_LOADS), size=n),
+            'cqi': rng.uniform(0.1, 1.0, size=n)
+        }
+        if size_model is not None:
+            columns['packet_size'] = size_model.sample(n)
+        return PacketBatch(stream_id, traffic_type, characteristics, columns)
+
+    def stream(self, user_density, traffic_type, stream_id, batch_size=64, size_model=None, rng=None):
+        # Endless per-packet iterator that refills one batch at a time
+        while True:
+            yield from self.generate(user_density, traffic_type, stream_id, batch_size, size_model, rng)
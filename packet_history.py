@@ -0,0 +1,79 @@
+# packet_history.py
+
+import numpy as np
+
+from timestamps import ns_to_iso
+
+HISTORY_DTYPE = np.dtype([
+    ('timestamp', np.int64),  # epoch nanoseconds
+    ('sequence_number', np.int64),
+    ('data_rate', np.float64),
+    ('latency', np.float64),
+    ('packet_loss', np.float64),
+    ('cqi', np.float64),
+])
+
+
+def history_row(timestamp_ns, sequence_number, packet_data):
+    return (
+        timestamp_ns,
+        sequence_number,
+        packet_data.get('data_rate', 0),
+        packet_data.get('latency', 0),
+        packet_data.get('packet_loss', 0),
+        packet_data.get('cqi', 0)
+    )
+
+
+def records_to_dicts(rows, time_format='iso'):
+    return [
+        {
+            'timestamp': ns_to_iso(int(row['timestamp'])) if time_format == 'iso' else int(row['timestamp']),
+            'sequence_number': int(row['sequence_number']),
+            'data_rate': float(row['data_rate']),
+            'latency': float(row['latency']),
+            'packet_loss': float(row['packet_loss']),
+            'cqi': float(row['cqi'])
+        }
+        for row in rows
+    ]
+
+
+class PacketHistory:
+    """Fixed-capacity ring buffer of one stream's recent packets.
+
+    Rows are stored as numbers in a preallocated NumPy structured array, so
+    appending is O(1) and memory per stream is fixed (capacity * 48 bytes).
+    Dicts are only built when the history is read.
+    """
+
+    def __init__(self, capacity=1000):
+        self.records = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def append(self, timestamp_ns, sequence_number, packet_data):
+        self.records[self.head] = history_row(timestamp_ns, sequence_number, packet_data)
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def ordered(self):
+        # Oldest-first view of the stored rows
+        if self.size < self.capacity:
+            return self.records[:self.size]
+        return np.concatenate((self.records[self.head:], self.records[:self.head]))
+
+    def to_dicts(self, limit=None, time_format='iso'):
+        rows = self.ordered()
+        if limit is not None:
+            rows = rows[-limit:]
+        return records_to_dicts(rows, time_format)
@@ -0,0 +1,227 @@
+# packet_log.py
+
+import glob
+import json
+import os
+
+import numpy as np
+
+from packet_history import HISTORY_DTYPE, history_row
+
+# One fixed-width entry per block. max_last_ns is the largest last_ns of this
+# and every earlier entry in the segment, so it never decreases and a start
+# time can be binary-searched.
+INDEX_DTYPE = np.dtype([
+    ('stream', np.uint32),  # line number in the segment's .streams file
+    ('count', np.uint32),
+    ('offset', np.int64),
+    ('first_ns', np.int64),
+    ('last_ns', np.int64),
+    ('max_last_ns', np.int64),
+])
+
+
+class PacketLog:
+    """Append-only on-disk log of processed packets.
+
+    Packets are buffered per stream and written as blocks of fixed-width
+    HISTORY_DTYPE records, so each block holds one stream's packets in
+    arrival order. Blocks go into segment_NNNNNN.log files, and a new segment
+    starts once the current one reaches segment_bytes. Every block gets one
+    INDEX_DTYPE entry in the segment's binary .idx file; stream ids are
+    numbered per segment in its .streams file (one JSON string per line).
+    Partial blocks stay in memory (see tail()) until they fill up, their
+    stream is flushed, or they are older than flush(max_age_ns=...) allows.
+    """
+
+    def __init__(self, directory, block_records=256, segment_bytes=64 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.block_records = block_records
+        self.block_nbytes = block_records * HISTORY_DTYPE.itemsize
+        self.segment_bytes = segment_bytes
+        self.buffers = {}  # stream_id -> [records, size]
+        # Never append to a previous run's segments; start after them
+        existing = sorted(glob.glob(os.path.join(directory, 'segment_*.log')))
+        self.segment_number = int(os.path.basename(existing[-1])[8:14]) + 1 if existing else 0
+        self._open_segment()
+
+    def _open_segment(self):
+        base = os.path.join(self.directory, f'segment_{self.segment_number:06d}')
+        self.log_file = open(base + '.log', 'ab')
+        self.index_file = open(base + '.idx', 'ab')
+        self.streams_file = open(base + '.streams', 'a', encoding='utf-8')
+        self.stream_numbers = {}
+        self.segment_records = 0
+        self.segment_blocks = 0
+        self.max_last_ns = 0
+
+    def _close_segment(self):
+        self.log_file.close()
+        self.index_file.close()
+        self.streams_file.close()
+
+    def append(self, stream_id, timestamp_ns, sequence_number, packet_data):
+        buffer = self.buffers.get(stream_id)
+        if buffer is None:
+            buffer = self.buffers[stream_id] = [np.zeros(self.block_records, dtype=HISTORY_DTYPE), 0]
+        buffer[0][buffer[1]] = history_row(timestamp_ns, sequence_number, packet_data)
+        buffer[1] += 1
+        if buffer[1] == self.block_records:
+            self._write_block(stream_id, buffer[0])
+            buffer[1] = 0
+
+    def _write_block(self, stream_id, records):
+        stream_number = self.stream_numbers.get(stream_id)
+        if stream_number is None:
+            stream_number = self.stream_numbers[stream_id] = len(self.stream_numbers)
+            self.streams_file.write(json.dumps(stream_id) + '\n')
+            self.streams_file.flush()
+        self.log_file.write(records.tobytes())
+        # Data is flushed before its index entry, so readers never see an
+        # entry that points past the end of the file
+        self.log_file.flush()
+        last_ns = int(records['timestamp'][-1])
+        self.max_last_ns = max(self.max_last_ns, last_ns)
+        entry = np.array(
+            [(stream_number, len(records), self.segment_records, records['timestamp'][0], last_ns, self.max_last_ns)],
+            dtype=INDEX_DTYPE
+        )
+        self.index_file.write(entry.tobytes())
+        self.index_file.flush()
+        self.segment_blocks += 1
+        self.segment_records += len(records)
+        if self.segment_records * HISTORY_DTYPE.itemsize >= self.segment_bytes:
+            self._close_segment()
+            self.segment_number += 1
+            self._open_segment()
+
+    def flush(self, max_age_ns=None, now_ns=None):
+        # Writes partial blocks; with max_age_ns, only those whose oldest
+        # packet is older than that, so slow streams still reach disk
+        # without every tick producing tiny blocks
+        for stream_id, buffer in self.buffers.items():
+            if not buffer[1]:
+                continue
+            if max_age_ns is not None and now_ns - buffer[0]['timestamp'][0] < max_age_ns:
+                continue
+            self._write_block(stream_id, buffer[0][:buffer[1]])
+            buffer[1] = 0
+
+    def flush_stream(self, stream_id):
+        # Called when a stream is evicted; its buffer is released
+        buffer = self.buffers.pop(stream_id, None)
+        if buffer is not None and buffer[1]:
+            self._write_block(stream_id, buffer[0][:buffer[1]])
+
+    def tail(self, stream_id=None, start_ns=None, end_ns=None):
+        # Yields (stream_id, records) for packets not yet written to disk
+        if stream_id is not None:
+            buffer = self.buffers.get(stream_id)
+            buffers = [(stream_id, buffer)] if buffer is not None else []
+        else:
+            buffers = list(self.buffers.items())
+        for buffered_id, (records, size) in buffers:
+            records = records[:size]
+            if start_ns is not None:
+                records = records[records['timestamp'] >= start_ns]
+            if end_ns is not None:
+                records = records[records['timestamp'] <= end_ns]
+            if len(records):
+                yield buffered_id, records.copy()
+
+    def high_water(self):
+        # Index position reached so far; blocks past it hold packets that
+        # were still in tail() when this was taken (see PacketLogReader.blocks)
+        return {'directory': self.directory, 'segment': self.segment_number, 'blocks': self.segment_blocks}
+
+    def close(self):
+        self.flush()
+        self._close_segment()
+
+
+class PacketLogReader:
+    """Time-range and stream queries over the segments under a directory.
+
+    Per-worker subdirectories are included. Only the stream names of each
+    segment are kept in memory; .idx files are memory-mapped per query, a
+    start time is binary-searched on max_last_ns, and only the matching
+    blocks are read, through np.memmap, so a query never loads a whole
+    segment.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.streams = {}  # segment base path -> [bytes read, stream ids, number by stream id]
+
+    def _load_streams(self, base):
+        state = self.streams.setdefault(base, [0, [], {}])
+        with open(base + '.streams', 'rb') as f:
+            f.seek(state[0])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # still being written
+                stream_id = json.loads(line)
+                state[2][stream_id] = len(state[1])
+                state[1].append(stream_id)
+                state[0] += len(line)
+        return state
+
+    def _segments(self, high_water=()):
+        limits = {os.path.normpath(mark['directory']): (mark['segment'], mark['blocks']) for mark in high_water}
+        pattern = os.path.join(self.directory, '**', 'segment_*.idx')
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            base = path[:-len('.idx')]
+            # Only whole entries; the last one may still be being written
+            count = os.path.getsize(path) // INDEX_DTYPE.itemsize
+            limit = limits.get(os.path.normpath(os.path.dirname(path)))
+            if limit is not None:
+                segment_number = int(os.path.basename(base)[8:14])
+                if segment_number > limit[0]:
+                    continue
+                if segment_number == limit[0]:
+                    count = min(count, limit[1])
+            if count and os.path.exists(base + '.streams'):
+                yield base, np.memmap(path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+
+    def blocks(self, stream_id=None, start_ns=None, end_ns=None, high_water=()):
+        # high_water: PacketLog.high_water() marks; a writer's blocks past its
+        # mark are left out, as their packets come from that writer's tail
+        matches = []
+        for base, entries in self._segments(high_water):
+            names, numbers = self._load_streams(base)[1:]
+            if start_ns is not None:
+                entries = entries[np.searchsorted(entries['max_last_ns'], start_ns):]
+            mask = np.ones(len(entries), dtype=bool)
+            if stream_id is not None:
+                if stream_id not in numbers:
+                    continue
+                mask &= entries['stream'] == numbers[stream_id]
+            if start_ns is not None:
+                mask &= entries['last_ns'] >= start_ns
+            if end_ns is not None:
+                mask &= entries['first_ns'] <= end_ns
+            for entry in entries[mask]:
+                matches.append((int(entry['first_ns']), base + '.log', names[entry['stream']],
+                                int(entry['offset']), int(entry['count'])))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def query(self, stream_id=None, start_ns=None, end_ns=None, chunk_records=4096):
+        # Yields (stream_id, records) chunks ordered by block start time
+        return self.read_blocks(self.blocks(stream_id, start_ns, end_ns), start_ns, end_ns, chunk_records)
+
+    def read_blocks(self, blocks, start_ns=None, end_ns=None, chunk_records=4096):
+        # Reads a blocks() result; the list is fixed before the first chunk
+        segments = {}
+        for _, log_path, block_stream_id, offset, count in blocks:
+            records = segments.get(log_path)
+            if records is None:
+                records = segments[log_path] = np.memmap(log_path, dtype=HISTORY_DTYPE, mode='r')
+            block = records[offset:offset + count]
+            if start_ns is not None:
+                block = block[block['timestamp'] >= start_ns]
+            if end_ns is not None:
+                block = block[block['timestamp'] <= end_ns]
+            for start in range(0, len(block), chunk_records):
+                yield block_stream_id, block[start:start + chunk_records]
@@ -1,120 +1,861 @@
 # packet_processor.py
 
 from aiohttp import web
+import aiohttp
+import argparse
 import asyncio
 import json
 import logging
-import datetime
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from packet_history import PacketHistory, records_to_dicts
+from packet_log import PacketLog, PacketLogReader
+from stream_sketches import StreamSketches
+from timestamps import format_duration_ns, ns_to_datetime, ns_to_iso
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rough size of a stream's dicts and objects, on top of its NumPy buffers
+STREAM_OVERHEAD_BYTES = 1024
+# A peer worker that does not answer within this is left out of merged views
+PEER_TIMEOUT = aiohttp.ClientTimeout(total=1.0)
+# /statistics/stream/ writes a comment line after this long without a delta
+SSE_HEARTBEAT_SECONDS = 15.0
+# /statistics/ yields to the event loop after formatting this many streams
+FORMAT_YIELD_STREAMS = 1000
+
+
 class PacketProcessor:
-    def __init__(self):
-        self.processed_packets = {}
-        self.packet_statistics = {}
+    """Per-stream counters, sketches and recent-packet history.
+
+    Both dicts are kept in least-recently-used order. Streams idle for longer
+    than idle_ttl seconds are dropped by evict_idle(). When memory_bytes goes
+    over memory_budget, the oldest history buffers are dropped first, then
+    whole streams. Dropped streams can be appended to evicted_path as NDJSON.
+    With a packet_log, every packet is also appended to disk.
+    """
+
+    def __init__(self, history_size=1000, idle_ttl=None, memory_budget=None, evicted_path=None, packet_log=None):
+        self.history_size = history_size
+        self.packet_log = packet_log
+        self.stream_overhead = STREAM_OVERHEAD_BYTES + (packet_log.block_nbytes if packet_log is not None else 0)
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.evicted_path = evicted_path
+        self.processed_packets = OrderedDict()
+        self.packet_statistics = OrderedDict()
+        self.sketches = {}
+        self.memory_bytes = 0
+        self.evicted_streams = 0
+        # consumer -> ids of streams updated since that consumer last asked
+        self.changes = {}
+
+    def stream_memory(self, stream_id):
+        history = self.processed_packets.get(stream_id)
+        return (
+            self.stream_overhead
+            + self.sketches[stream_id].nbytes
+            + (history.nbytes if history is not None else 0)
+        )
+
+    def _add_history(self, stream_id):
+        history = self.processed_packets[stream_id] = PacketHistory(self.history_size)
+        self.memory_bytes += history.nbytes
 
-    def initialize_stream(self, stream_id):
-        if stream_id not in self.processed_packets:
-            self.processed_packets[stream_id] = []
+    def initialize_stream(self, stream_id, traffic_type=None):
+        if stream_id not in self.packet_statistics:
+            self.sketches[stream_id] = StreamSketches()
+            self.memory_bytes += self.stream_overhead + self.sketches[stream_id].nbytes
             self.packet_statistics[stream_id] = {
+                'traffic_type': traffic_type,
                 'total_packets': 0,
                 'total_data': 0,
-                'start_time': datetime.datetime.now(),
-                'last_packet_time': None
+                'start_time_ns': time.monotonic_ns(),
+                'last_packet_time_ns': None,  # epoch ns
+                # Measured from sender-stamped 'seq' / 'sent_at_ns' (see _record_delivery)
+                'first_seq': None,
+                'max_seq': None,
+                'received_seq': 0,
+                'reordered': 0,
+                'jitter_ns': 0.0,
+                'last_transit_ns': None
             }
 
-    async def process_packet(self, packet_data):
-        stream_id = packet_data.get('stream_id')
-        if not stream_id:
-            return {'error': 'Missing stream_id'}
+    def _record_packet(self, stream_id, packet_data, now_ns):
+        self.initialize_stream(stream_id, packet_data.get('traffic_type'))
+        self.packet_statistics.move_to_end(stream_id)
+        if stream_id in self.processed_packets:
+            self.processed_packets.move_to_end(stream_id)
+        else:
+            # New stream, or one whose history was evicted for memory
+            self._add_history(stream_id)
+            self._enforce_budget()
 
-        self.initialize_stream(stream_id)
-        
         # Update statistics
         stats = self.packet_statistics[stream_id]
+        last_packet_ns = stats['last_packet_time_ns']
+        sent_at_ns = packet_data.get('sent_at_ns')
+        self.sketches[stream_id].record(
+            packet_data,
+            now_ns - last_packet_ns if last_packet_ns is not None else None,
+            now_ns - sent_at_ns if sent_at_ns is not None else None
+        )
+        if packet_data.get('seq') is not None:
+            self._record_delivery(stats, packet_data['seq'], sent_at_ns, now_ns)
         stats['total_packets'] += 1
         stats['total_data'] += packet_data.get('data_rate', 0)
-        current_time = datetime.datetime.now()
-        stats['last_packet_time'] = current_time
-
-        # Store processed packet
-        processed_packet = {
-            'timestamp': current_time.isoformat(),
-            'data': packet_data,
-            'processing_results': {
-                'received_at': current_time.isoformat(),
-                'processed_successfully': True,
-                'sequence_number': stats['total_packets']
-            }
+        stats['last_packet_time_ns'] = now_ns
+        for changed in self.changes.values():
+            changed.add(stream_id)
+
+        # Store processed packet; the ring buffer keeps the last history_size
+        self.processed_packets[stream_id].append(now_ns, stats['total_packets'], packet_data)
+        if self.packet_log is not None:
+            self.packet_log.append(stream_id, now_ns, stats['total_packets'], packet_data)
+
+        return stats['total_packets']
+
+    def _record_delivery(self, stats, seq, sent_at_ns, now_ns):
+        # Sequence-gap loss, reordering and RFC 3550 interarrival jitter, O(1) per packet
+        if stats['max_seq'] is None:
+            stats['first_seq'] = stats['max_seq'] = seq
+        elif seq > stats['max_seq']:
+            stats['max_seq'] = seq
+        else:
+            # Late (or duplicate) arrival
+            stats['reordered'] += 1
+            stats['first_seq'] = min(stats['first_seq'], seq)
+        stats['received_seq'] += 1
+        if sent_at_ns is not None:
+            transit_ns = now_ns - sent_at_ns
+            if stats['last_transit_ns'] is not None:
+                stats['jitter_ns'] += (abs(transit_ns - stats['last_transit_ns']) - stats['jitter_ns']) / 16
+            stats['last_transit_ns'] = transit_ns
+
+    def _enforce_budget(self):
+        # Drop least recently used history buffers, then whole streams, but
+        # never the stream that is being recorded (the most recent one)
+        if self.memory_budget is None:
+            return
+        evicted = []
+        while self.memory_bytes > self.memory_budget and len(self.processed_packets) > 1:
+            _, history = self.processed_packets.popitem(last=False)
+            self.memory_bytes -= history.nbytes
+        while self.memory_bytes > self.memory_budget and len(self.packet_statistics) > 1:
+            evicted.append(self._evict(next(iter(self.packet_statistics)), 'memory'))
+        self._flush_evicted(evicted)
+
+    def evict_idle(self, now_ns=None):
+        # Streams are in last-packet order, so stop at the first live one
+        if self.idle_ttl is None:
+            return 0
+        cutoff_ns = (now_ns if now_ns is not None else time.time_ns()) - int(self.idle_ttl * 1e9)
+        evicted = []
+        for stream_id, stats in self.packet_statistics.items():
+            if stats['last_packet_time_ns'] >= cutoff_ns:
+                break
+            evicted.append(stream_id)
+        evicted = [self._evict(stream_id, 'idle') for stream_id in evicted]
+        self._flush_evicted(evicted)
+        return len(evicted)
+
+    def _evict(self, stream_id, reason):
+        self.memory_bytes -= self.stream_memory(stream_id)
+        record = {
+            'stream_id': stream_id,
+            'reason': reason,
+            'evicted_at_ns': time.time_ns(),
+            'statistics': self.export_statistics([stream_id])[stream_id]
         }
-        self.processed_packets[stream_id].append(processed_packet)
+        self.processed_packets.pop(stream_id, None)
+        if self.packet_log is not None:
+            self.packet_log.flush_stream(stream_id)
+        del self.packet_statistics[stream_id]
+        del self.sketches[stream_id]
+        self.evicted_streams += 1
+        # Lets push consumers drop the stream too
+        for changed in self.changes.values():
+            changed.add(stream_id)
+        return record
+
+    def _flush_evicted(self, records):
+        if records and self.evicted_path:
+            with open(self.evicted_path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+
+    def memory_report(self, per_stream=False, stream_ids=False):
+        report = {
+            'total_bytes': self.memory_bytes,
+            'budget_bytes': self.memory_budget,
+            'streams': len(self.packet_statistics),
+            'histories': len(self.processed_packets),
+            'evicted_streams': self.evicted_streams
+        }
+        if per_stream:
+            report['per_stream'] = {stream_id: self.stream_memory(stream_id) for stream_id in self.packet_statistics}
+        elif stream_ids:
+            # Lets a merged view count streams seen by several workers once
+            report['stream_ids'] = list(self.packet_statistics)
+        return report
+
+    def export_statistics(self, stream_ids=None, sparse=True):
+        # Raw, mergeable per-stream counters and sketches (see merge_statistics).
+        # sparse=False hands out the live StreamSketches for in-process merging.
+        if stream_ids is None:
+            stream_ids = list(self.packet_statistics)
+        return {
+            stream_id: dict(
+                self.packet_statistics[stream_id],
+                sketches=self.sketches[stream_id].to_sparse() if sparse else self.sketches[stream_id]
+            )
+            for stream_id in stream_ids
+        }
+
+    def take_changes(self, consumer):
+        # Stats of streams updated since this consumer's last call; a new
+        # consumer starts out with every known stream
+        changed = self.changes.get(consumer)
+        if changed is None:
+            changed = set(self.packet_statistics)
+        self.changes[consumer] = set()
+        # Evicted streams are reported as None
+        exports = self.export_statistics([stream_id for stream_id in changed if stream_id in self.packet_statistics])
+        exports.update((stream_id, None) for stream_id in changed if stream_id not in exports)
+        return exports
+
+    def get_recent_packets(self, stream_id, limit=None, time_format='iso'):
+        if stream_id not in self.packet_statistics:
+            return None
+        history = self.processed_packets.get(stream_id)
+        return history.to_dicts(limit, time_format) if history is not None else []
 
-        # Keep only last 1000 packets per stream
-        if len(self.processed_packets[stream_id]) > 1000:
-            self.processed_packets[stream_id].pop(0)
+    async def process_packet(self, packet_data):
+        stream_id = packet_data.get('stream_id')
+        if not stream_id:
+            return {'error': 'Missing stream_id'}
+
+        now_ns = time.time_ns()
+        packet_number = self._record_packet(stream_id, packet_data, now_ns)
 
         return {
             'status': 'success',
-            'processed_at': current_time.isoformat(),
+            'processed_at_ns': now_ns,
             'stream_id': stream_id,
-            'packet_number': stats['total_packets']
+            'packet_number': packet_number
+        }
+
+    async def process_batch(self, packets):
+        now_ns = time.time_ns()
+        streams = {}
+        rejected = []
+
+        for index, packet_data in enumerate(packets):
+            stream_id = packet_data.get('stream_id') if isinstance(packet_data, dict) else None
+            if not stream_id:
+                rejected.append(index)
+                continue
+            packet_number = self._record_packet(stream_id, packet_data, now_ns)
+            # Packets of one stream get consecutive numbers within a batch,
+            # so each stream's numbers are returned as [first, count]
+            if stream_id in streams:
+                streams[stream_id][1] += 1
+            else:
+                streams[stream_id] = [packet_number, 1]
+
+        return {
+            'status': 'success',
+            'processed_at_ns': now_ns,
+            'processed': len(packets) - len(rejected),
+            'streams': streams,
+            'rejected': rejected
         }
 
+def merge_statistics(exports):
+    """Merge per-worker export_statistics() results into one view.
+
+    Counters are summed, the start time is the earliest and the last packet
+    time the latest seen by any worker. Sketches are merged into
+    StreamSketches objects; live ones (export_statistics(sparse=False)) are
+    only copied once another worker's sketches must be merged into them.
+    Sequence ranges merge exactly, so loss is exact; reordering is summed and
+    jitter averaged by packet count, which only approximates what a single
+    receiver would have seen.
+    """
+    merged = {}
+    shared = set()  # streams whose merged sketches are still a worker's live ones
+    for export in exports:
+        for stream_id, stats in export.items():
+            entry = merged.get(stream_id)
+            sketches = stats['sketches']
+            if not isinstance(sketches, StreamSketches):
+                sketches = StreamSketches.from_sparse(sketches)
+            elif entry is None:
+                shared.add(stream_id)
+            if entry is None:
+                merged[stream_id] = dict(stats, sketches=sketches)
+                continue
+            if stream_id in shared:
+                shared.discard(stream_id)
+                entry['sketches'] = entry['sketches'].copy()
+            entry['sketches'].merge(sketches)
+            entry['traffic_type'] = entry['traffic_type'] or stats['traffic_type']
+            entry['total_packets'] += stats['total_packets']
+            entry['total_data'] += stats['total_data']
+            entry['start_time_ns'] = min(entry['start_time_ns'], stats['start_time_ns'])
+            if stats['last_packet_time_ns'] is not None:
+                entry['last_packet_time_ns'] = max(entry['last_packet_time_ns'] or 0, stats['last_packet_time_ns'])
+            if stats['max_seq'] is not None:
+                if entry['max_seq'] is None:
+                    for key in ('first_seq', 'max_seq', 'received_seq', 'reordered', 'jitter_ns'):
+                        entry[key] = stats[key]
+                    continue
+                received = entry['received_seq'] + stats['received_seq']
+                entry['jitter_ns'] = (
+                    entry['jitter_ns'] * entry['received_seq'] + stats['jitter_ns'] * stats['received_seq']
+                ) / received
+                entry['first_seq'] = min(entry['first_seq'], stats['first_seq'])
+                entry['max_seq'] = max(entry['max_seq'], stats['max_seq'])
+                entry['received_seq'] = received
+                entry['reordered'] += stats['reordered']
+    return merged
+
+
+def merge_by_traffic_type(merged):
+    # Group merge_statistics() output per traffic type
+    traffic_types = {}
+    for stream_stats in merged.values():
+        entry = traffic_types.get(stream_stats['traffic_type'])
+        if entry is None:
+            entry = traffic_types[stream_stats['traffic_type']] = {
+                'streams': 0,
+                'total_packets': 0,
+                'total_data': 0,
+                'sketches': StreamSketches()
+            }
+        entry['streams'] += 1
+        entry['total_packets'] += stream_stats['total_packets']
+        entry['total_data'] += stream_stats['total_data']
+        entry['sketches'].merge(stream_stats['sketches'])
+    return traffic_types
+
+
+def _time_format(request):
+    # ?time_format=ns returns raw epoch/duration nanoseconds instead of strings
+    return 'ns' if request.query.get('time_format') == 'ns' else 'iso'
+
+
+def _format_stream_stats(stream_stats, now_ns, time_format):
+    uptime_ns = now_ns - stream_stats['start_time_ns']
+    last_packet_ns = stream_stats['last_packet_time_ns']
+    entry = {
+        'traffic_type': stream_stats['traffic_type'],
+        'total_packets': stream_stats['total_packets'],
+        'total_data': stream_stats['total_data']
+    }
+    if time_format == 'ns':
+        entry['uptime_ns'] = uptime_ns
+        entry['last_packet_ns'] = last_packet_ns
+    else:
+        entry['uptime'] = format_duration_ns(uptime_ns)
+        entry['last_packet'] = str(ns_to_datetime(last_packet_ns) if last_packet_ns is not None else None)
+    # Percentiles of latency, data rate, inter-arrival time and one-way delay
+    entry.update(stream_stats['sketches'].summary())
+    if stream_stats['max_seq'] is not None:
+        # Measured on the wire, next to the synthetic latency / packet_loss fields
+        expected = stream_stats['max_seq'] - stream_stats['first_seq'] + 1
+        lost = max(expected - stream_stats['received_seq'], 0)
+        entry['measured'] = {
+            'received': stream_stats['received_seq'],
+            'lost': lost,
+            'loss_pct': lost / expected * 100,
+            'reordered': stream_stats['reordered'],
+            'jitter_ms': stream_stats['jitter_ns'] / 1e6
+        }
+    return entry
+
+
+def _format_result(result, time_format):
+    if time_format == 'iso' and 'processed_at_ns' in result:
+        result['processed_at'] = ns_to_iso(result.pop('processed_at_ns'))
+    return result
+
+
+class _StatsSubscriber:
+    """One /statistics/stream/ client.
+
+    Deltas that arrive while the client is still writing are folded into
+    pending, so a slow client holds at most one entry per stream.
+    """
+
+    def __init__(self, prefix, time_format):
+        self.prefix = prefix
+        self.time_format = time_format
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def offer(self, merged, now_ns):
+        # A None entry tells the client the stream was evicted
+        for stream_id, stream_stats in merged.items():
+            if stream_id.startswith(self.prefix):
+                self.pending[stream_id] = (
+                    _format_stream_stats(stream_stats, now_ns, self.time_format) if stream_stats is not None else None
+                )
+        if self.pending:
+            self.ready.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return pending
+
+
 class PacketProcessingServer:
-    def __init__(self):
+    def __init__(self, worker_id=None, peer_sockets=(), stats_interval=1.0, processor_config=None):
         self.app = web.Application()
-        self.processor = PacketProcessor()
+        processor_config = dict(processor_config or {})
+        log_dir = processor_config.pop('log_dir', None)
+        log_segment_bytes = processor_config.pop('log_segment_bytes', 64 * 1024 * 1024)
+        self.log_reader = None
+        if log_dir:
+            # Each worker writes its own subdirectory; queries read all of them
+            worker_dir = os.path.join(log_dir, f'worker_{worker_id}') if worker_id is not None else log_dir
+            processor_config['packet_log'] = PacketLog(worker_dir, segment_bytes=log_segment_bytes)
+            self.log_reader = PacketLogReader(log_dir)
+        self.processor = PacketProcessor(**processor_config)
+        # In --workers mode, the other workers' unix sockets for merged views
+        self.worker_id = worker_id
+        self.peer_sockets = list(peer_sockets)
+        # Push mode: one task computes deltas every stats_interval for all subscribers
+        self.stats_interval = stats_interval
+        self.stats_subscribers = set()
+        self.stats_pusher = None
+        self.peer_stats = {}  # socket path -> last stats seen per stream
+        self.peer_sessions = {}
         self.setup_routes()
+        self.background_tasks = []
+        self.app.on_startup.append(self._start_background)
+        self.app.on_cleanup.append(self._stop_background)
+
+    async def _start_background(self, app):
+        loop = asyncio.get_running_loop()
+        if self.processor.idle_ttl is not None:
+            self.background_tasks.append(loop.create_task(self._evict_idle_streams()))
+        if self.processor.packet_log is not None:
+            self.background_tasks.append(loop.create_task(self._flush_packet_log()))
+
+    async def _stop_background(self, app):
+        for task in self.background_tasks:
+            task.cancel()
+        for session in self.peer_sessions.values():
+            await session.close()
+        if self.processor.packet_log is not None:
+            self.processor.packet_log.close()
+
+    async def _flush_packet_log(self, interval=10.0, max_age=60.0):
+        # Recent packets are served from the buffers (see get_history), so
+        # partial blocks are only written once they get old
+        while True:
+            await asyncio.sleep(interval)
+            self.processor.packet_log.flush(int(max_age * 1e9), time.time_ns())
+
+    async def _evict_idle_streams(self):
+        interval = min(self.processor.idle_ttl / 4, 10)
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.processor.evict_idle()
+            if evicted:
+                logger.info(f"Evicted {evicted} idle streams")
 
     def setup_routes(self):
         self.app.router.add_post('/process_packet/', self.handle_packet)
+        self.app.router.add_post('/process_batch/', self.handle_batch)
         self.app.router.add_get('/statistics/', self.get_statistics)
+        self.app.router.add_get('/statistics/stream/', self.stream_statistics)
+        self.app.router.add_get('/statistics/traffic_types/', self.get_traffic_type_statistics)
         self.app.router.add_get('/health/', self.health_check)
+        self.app.router.add_get('/history/', self.get_history)
+        self.app.router.add_get('/_worker/statistics/', self.get_worker_statistics)
+        self.app.router.add_get('/_worker/statistics/changes/', self.get_worker_changes)
+        self.app.router.add_get('/_worker/memory/', self.get_worker_memory)
+        self.app.router.add_get('/_worker/history/tail/', self.get_worker_history_tail)
+
+    async def get_worker_statistics(self, request):
+        return web.json_response(self.processor.export_statistics())
+
+    async def get_worker_changes(self, request):
+        return web.json_response(self.processor.take_changes(request.query['consumer']))
+
+    async def get_worker_memory(self, request):
+        return web.json_response(self.processor.memory_report(
+            per_stream=request.query.get('per_stream') == '1', stream_ids=True
+        ))
+
+    async def get_worker_history_tail(self, request):
+        start_ns = int(request.query['start_ns']) if 'start_ns' in request.query else None
+        end_ns = int(request.query['end_ns']) if 'end_ns' in request.query else None
+        if self.processor.packet_log is None:
+            return web.json_response(None)
+        # Tail and high-water mark come from the same instant
+        high_water = self.processor.packet_log.high_water()
+        rows = self._history_tail(
+            list(self.processor.packet_log.tail(request.query.get('stream_id'), start_ns, end_ns)),
+            request.query.get('time_format', 'iso')
+        )
+        return web.json_response({'high_water': high_water, 'rows': rows})
+
+    def _history_tail(self, tail, time_format):
+        # Rows of PacketLog.tail() chunks: packets still buffered, not on disk
+        return [
+            {'stream_id': tail_stream_id, **row}
+            for tail_stream_id, records in tail
+            for row in records_to_dicts(records, time_format)
+        ]
+
+    def _peer_session(self, socket_path):
+        # One keep-alive session per peer socket, created on first use
+        session = self.peer_sessions.get(socket_path)
+        if session is None or session.closed:
+            session = self.peer_sessions[socket_path] = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=socket_path),
+                timeout=PEER_TIMEOUT
+            )
+        return session
+
+    async def _fetch_peer_statistics(self, socket_path, path='/_worker/statistics/'):
+        try:
+            async with self._peer_session(socket_path).get(f'http://worker{path}') as response:
+                return await response.json()
+        except Exception as e:
+            logger.warning(f"Worker at {socket_path} did not report statistics: {str(e)}")
+            return None
+
+    async def collect_statistics(self):
+        # This worker's counters merged with every reachable peer's
+        exports = [self.processor.export_statistics(sparse=False)]
+        if self.peer_sockets:
+            peers = await asyncio.gather(*(self._fetch_peer_statistics(path) for path in self.peer_sockets))
+            exports += [export for export in peers if export is not None]
+        return merge_statistics(exports), len(exports)
+
+    async def collect_changes(self, consumer):
+        # Merged stats of the streams that changed on any worker since the last call.
+        # Peers only report their changed streams, so their other totals come
+        # from peer_stats.
+        local = self.processor.take_changes(consumer)
+        changed = set(local)
+        if self.peer_sockets:
+            path = f'/_worker/statistics/changes/?consumer={consumer}'
+            peers = await asyncio.gather(*(self._fetch_peer_statistics(socket, path) for socket in self.peer_sockets))
+            for socket, export in zip(self.peer_sockets, peers):
+                if export:
+                    cached = self.peer_stats.setdefault(socket, {})
+                    for stream_id, stats in export.items():
+                        if stats is None:
+                            cached.pop(stream_id, None)
+                        else:
+                            cached[stream_id] = stats
+                    changed.update(export)
+        exports = [self.processor.export_statistics(
+            [stream_id for stream_id in changed if stream_id in self.processor.packet_statistics], sparse=False
+        )]
+        for cached in self.peer_stats.values():
+            exports.append({stream_id: cached[stream_id] for stream_id in changed if stream_id in cached})
+        merged = merge_statistics(exports)
+        merged.update((stream_id, None) for stream_id in changed if stream_id not in merged)
+        return merged
+
+    async def _push_statistics(self):
+        consumer = f'push-{self.worker_id}'
+        # Local totals are read directly, so earlier changes need not be replayed
+        self.processor.take_changes(consumer)
+        try:
+            while self.stats_subscribers:
+                await asyncio.sleep(self.stats_interval)
+                merged = await self.collect_changes(consumer)
+                if merged:
+                    now_ns = time.monotonic_ns()
+                    for subscriber in list(self.stats_subscribers):
+                        subscriber.offer(merged, now_ns)
+        finally:
+            self.processor.changes.pop(consumer, None)
+            self.stats_pusher = None
+
+    async def stream_statistics(self, request):
+        # Server-sent events: a full snapshot, then one delta per tick holding
+        # only the streams that changed, optionally limited to ?prefix=
+        subscriber = _StatsSubscriber(request.query.get('prefix', ''), _time_format(request))
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*'
+        })
+        await response.prepare(request)
+
+        self.stats_subscribers.add(subscriber)
+        if self.stats_pusher is None:
+            self.stats_pusher = asyncio.get_running_loop().create_task(self._push_statistics())
+        try:
+            merged, _ = await self.collect_statistics()
+            subscriber.offer(merged, time.monotonic_ns())
+            event = 'snapshot'
+            while True:
+                data = json.dumps(subscriber.take())
+                await response.write(f'event: {event}\ndata: {data}\n\n'.encode())
+                event = 'delta'
+                # Idle streams still get a comment line now and then, so a
+                # client that went away is noticed and unsubscribed
+                while True:
+                    try:
+                        await asyncio.wait_for(subscriber.ready.wait(), SSE_HEARTBEAT_SECONDS)
+                        break
+                    except asyncio.TimeoutError:
+                        await response.write(b': ping\n\n')
+        except ConnectionResetError:
+            pass
+        finally:
+            self.stats_subscribers.discard(subscriber)
+        return response
 
     async def handle_packet(self, request):
         try:
             packet_data = await request.json()
             result = await self.processor.process_packet(packet_data)
-            return web.json_response(result)
+            return web.json_response(_format_result(result, _time_format(request)))
         except Exception as e:
             logger.error(f"Error processing packet: {str(e)}")
             return web.json_response({'error': str(e)}, status=500)
 
+    async def handle_batch(self, request):
+        try:
+            # Accept either a JSON array or newline-delimited JSON packets
+            if request.content_type == 'application/x-ndjson':
+                body = await request.text()
+                packets = [json.loads(line) for line in body.splitlines() if line.strip()]
+            else:
+                packets = await request.json()
+            if not isinstance(packets, list):
+                return web.json_response({'error': 'Expected a list of packets'}, status=400)
+            result = await self.processor.process_batch(packets)
+            return web.json_response(_format_result(result, _time_format(request)))
+        except Exception as e:
+            logger.error(f"Error processing batch: {str(e)}")
+            return web.json_response({'error': str(e)}, status=500)
+
     async def get_statistics(self, request):
-        stats = {
-            stream_id: {
-                'total_packets': stats['total_packets'],
-                'total_data': stats['total_data'],
-                'uptime': str(datetime.datetime.now() - stats['start_time']),
-                'last_packet': str(stats['last_packet_time'])
-            }
-            for stream_id, stats in self.processor.packet_statistics.items()
-        }
+        time_format = _time_format(request)
+        now_ns = time.monotonic_ns()
+        merged, _ = await self.collect_statistics()
+        stats = {}
+        for count, (stream_id, stream_stats) in enumerate(merged.items(), 1):
+            stats[stream_id] = _format_stream_stats(stream_stats, now_ns, time_format)
+            if count % FORMAT_YIELD_STREAMS == 0:
+                # Let packets and health checks through on large tables
+                await asyncio.sleep(0)
+        return web.json_response(stats)
+
+    async def get_traffic_type_statistics(self, request):
+        merged, _ = await self.collect_statistics()
+        stats = {}
+        for traffic_type, entry in merge_by_traffic_type(merged).items():
+            sketches = entry.pop('sketches')
+            entry.update(sketches.summary())
+            stats[str(traffic_type)] = entry
         return web.json_response(stats)
 
+    async def get_history(self, request):
+        # NDJSON records from the on-disk log, written chunk by chunk, followed
+        # by the packets every worker still holds in its unflushed buffers
+        if self.log_reader is None:
+            return web.json_response({'error': 'Packet log is not enabled (--log-dir)'}, status=404)
+        try:
+            start_ns = int(request.query['start_ns']) if 'start_ns' in request.query else None
+            end_ns = int(request.query['end_ns']) if 'end_ns' in request.query else None
+            remaining = int(request.query['limit']) if 'limit' in request.query else None
+        except ValueError:
+            return web.json_response({'error': 'start_ns, end_ns and limit must be integers'}, status=400)
+        time_format = _time_format(request)
+        stream_id = request.query.get('stream_id')
+
+        # Peers snapshot their tails with an index high-water mark; their
+        # blocks written after that are skipped, since the tail has them
+        peer_tails = []
+        if self.peer_sockets:
+            params = {key: request.query[key] for key in ('stream_id', 'start_ns', 'end_ns') if key in request.query}
+            path = '/_worker/history/tail/?' + urlencode(dict(params, time_format=time_format))
+            peers = await asyncio.gather(*(self._fetch_peer_statistics(socket, path) for socket in self.peer_sockets))
+            peer_tails = [peer for peer in peers if peer]
+        # The block list and this worker's tail are taken together, with no
+        # await in between, so a block written meanwhile can't be missed
+        blocks = self.log_reader.blocks(stream_id, start_ns, end_ns, [peer['high_water'] for peer in peer_tails])
+        local_tail = []
+        if self.processor.packet_log is not None:
+            local_tail = list(self.processor.packet_log.tail(stream_id, start_ns, end_ns))
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'application/x-ndjson',
+            'Access-Control-Allow-Origin': '*'
+        })
+        await response.prepare(request)
+        for block_stream_id, records in self.log_reader.read_blocks(blocks, start_ns, end_ns):
+            if remaining is not None:
+                records = records[:remaining]
+                remaining -= len(records)
+            lines = [json.dumps({'stream_id': block_stream_id, **row}) for row in records_to_dicts(records, time_format)]
+            if lines:
+                await response.write(('\n'.join(lines) + '\n').encode())
+            if remaining == 0:
+                break
+        if remaining != 0:
+            rows = self._history_tail(local_tail, time_format)
+            rows += [row for peer in peer_tails for row in peer['rows']]
+            if remaining is not None:
+                rows = rows[:remaining]
+            if rows:
+                await response.write(('\n'.join(json.dumps(row) for row in rows) + '\n').encode())
+        await response.write_eof()
+        return response
+
+    async def collect_memory(self, per_stream=False):
+        # Memory reports of this worker and every reachable peer
+        reports = [self.processor.memory_report(per_stream, stream_ids=bool(self.peer_sockets))]
+        if self.peer_sockets:
+            path = '/_worker/memory/?per_stream=1' if per_stream else '/_worker/memory/'
+            peers = await asyncio.gather(*(self._fetch_peer_statistics(socket, path) for socket in self.peer_sockets))
+            reports += [report for report in peers if report is not None]
+        return reports
+
     async def health_check(self, request):
-        return web.json_response({
+        now_ns = time.time_ns()
+        # Per-stream sizes can be long, so they are opt-in: ?memory=streams
+        with_streams = request.query.get('memory') == 'streams'
+        reports = await self.collect_memory(per_stream=with_streams)
+        memory = {
+            'total_bytes': sum(report['total_bytes'] for report in reports),
+            'budget_bytes': self.processor.memory_budget,
+            'histories': sum(report['histories'] for report in reports),
+            'evicted_streams': sum(report['evicted_streams'] for report in reports)
+        }
+        # A stream that reached several workers counts once
+        if with_streams:
+            per_stream = {}
+            for report in reports:
+                for stream_id, size in report['per_stream'].items():
+                    per_stream[stream_id] = per_stream.get(stream_id, 0) + size
+            memory['per_stream'] = per_stream
+            active_streams = len(per_stream)
+        elif self.peer_sockets:
+            active_streams = len(set().union(*(report['stream_ids'] for report in reports)))
+        else:
+            active_streams = reports[0]['streams']
+        health = {
             'status': 'healthy',
-            'timestamp': datetime.datetime.now().isoformat(),
-            'active_streams': len(self.processor.packet_statistics)
-        })
+            'timestamp': now_ns if _time_format(request) == 'ns' else ns_to_iso(now_ns),
+            'active_streams': active_streams,
+            'memory': memory
+        }
+        if self.peer_sockets:
+            health['workers'] = len(self.peer_sockets) + 1
+            health['workers_reporting'] = len(reports)
+        return web.json_response(health)
 
 # CORS middleware
 @web.middleware
 async def cors_middleware(request, handler):
     response = await handler(request)
+    if response.prepared:
+        # Streaming responses set their own headers before the first write
+        return response
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
     return response
 
+def create_app(worker_id=None, peer_sockets=(), stats_interval=1.0, processor_config=None):
+    server = PacketProcessingServer(worker_id, peer_sockets, stats_interval, processor_config)
+    server.app.middlewares.append(cors_middleware)
+    return server.app
+
+
+async def _serve_worker(worker_id, host, port, socket_paths, stats_interval, processor_config):
+    processor_config = dict(processor_config)
+    if processor_config.get('evicted_path'):
+        # One file per worker, like the generator's trace files
+        processor_config['evicted_path'] = f"{processor_config['evicted_path']}.{worker_id}"
+    peers = [path for i, path in enumerate(socket_paths) if i != worker_id]
+    app = create_app(worker_id, peers, stats_interval, processor_config)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # Every worker binds the same port; the kernel spreads connections across them
+    await web.TCPSite(runner, host, port, reuse_port=True).start()
+    await web.UnixSite(runner, socket_paths[worker_id]).start()
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) serving on {host}:{port}")
+    await asyncio.Event().wait()
+
+
+def _run_worker(worker_id, host, port, socket_paths, stats_interval, processor_config):
+    try:
+        asyncio.run(_serve_worker(worker_id, host, port, socket_paths, stats_interval, processor_config))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(host, port, workers, stats_interval=1.0, processor_config=None):
+    socket_dir = tempfile.mkdtemp(prefix='packet_processor_')
+    socket_paths = [os.path.join(socket_dir, f'worker_{i}.sock') for i in range(workers)]
+    processes = [
+        multiprocessing.Process(target=_run_worker, args=(i, host, port, socket_paths, stats_interval, processor_config or {}), name=f'packet-worker-{i}')
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    finally:
+        for path in socket_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(socket_dir)
+
+
 if __name__ == '__main__':
-    server = PacketProcessingServer()
-    app = server.app
-    app.middlewares.append(cors_middleware)
-    
+    parser = argparse.ArgumentParser(description='Packet Processing Server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes sharing the port via SO_REUSEPORT')
+    parser.add_argument('--stats-interval', type=float, default=1.0,
+                        help='seconds between pushed deltas on /statistics/stream/')
+    parser.add_argument('--idle-ttl', type=float, default=None,
+                        help='drop streams that sent nothing for this many seconds')
+    parser.add_argument('--memory-budget-mb', type=float, default=None,
+                        help='per-process memory budget for stream state, enforced LRU')
+    parser.add_argument('--evicted-path', default=None,
+                        help='append evicted stream statistics to this NDJSON file')
+    parser.add_argument('--log-dir', default=None,
+                        help='append every packet to segment files here and serve /history/')
+    parser.add_argument('--log-segment-mb', type=float, default=64,
+                        help='size at which a new log segment is started')
+    args = parser.parse_args()
+    processor_config = {
+        'idle_ttl': args.idle_ttl,
+        'memory_budget': int(args.memory_budget_mb * 1024 * 1024) if args.memory_budget_mb else None,
+        'evicted_path': args.evicted_path,
+        'log_dir': args.log_dir,
+        'log_segment_bytes': int(args.log_segment_mb * 1024 * 1024)
+    }
+
     # Configure logging
     logging.basicConfig(
         level=logging.INFO,
@@ -123,5 +864,9 @@ if __name__ == '__main__':
     logger = logging.getLogger(__name__)
     
     # Start the server
-    logger.info("Starting Packet Processing Server on port 5432...")
-    web.run_app(app, host='127.0.0.1', port=5432)
\ No newline at end of file
+    logger.info(f"Starting Packet Processing Server on port {args.port}...")
+    if args.workers > 1:
+        run_workers(args.host, args.port, args.workers, args.stats_interval, processor_config)
+    else:
+        app = create_app(stats_interval=args.stats_interval, processor_config=processor_config)
+        web.run_app(app, host=args.host, port=args.port)
\ No newline at end of file
@@ -0,0 +1,98 @@
+# processor_cluster.py
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import threading
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes.
+
+    Removing a node only moves the keys that node owned; every other key
+    keeps its node.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def get_node(self, key):
+        if not self.hashes:
+            return None
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+class ProcessorCluster:
+    """Routes each stream to one of several packet processors.
+
+    Streams map to processors through a HashRing, so each stream's
+    statistics stay on one instance. A background task polls every
+    processor's /health/ route. A processor that fails is taken off the ring
+    until it answers again, and only the streams it owned move.
+    """
+
+    def __init__(self, urls, check_interval=2.0, timeout=1.0, replicas=100):
+        self.urls = list(urls)
+        self.check_interval = check_interval
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.replicas = replicas
+        self.healthy = set(self.urls)
+        self.ring = HashRing(self.urls, replicas)
+        # Fallback when every processor looks down
+        self.full_ring = self.ring
+        self.lock = threading.Lock()
+        self.checker = None
+
+    def url_for(self, stream_id):
+        # Falls back to the full list if every processor looks down
+        return self.ring.get_node(stream_id) or self.full_ring.get_node(stream_id)
+
+    def ensure_health_checks(self):
+        # Started once, on whichever event loop first routes a packet
+        with self.lock:
+            if self.checker is None:
+                self.checker = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def _set_healthy(self, healthy):
+        if healthy != self.healthy:
+            for url in self.healthy - healthy:
+                logger.warning(f"Processor {url} left the cluster")
+            for url in healthy - self.healthy:
+                logger.info(f"Processor {url} joined the cluster")
+            self.healthy = healthy
+            # Swap in a new ring; readers on other threads see the old or new one
+            self.ring = HashRing(sorted(healthy), self.replicas)
+
+    async def _check(self, session, url):
+        try:
+            async with session.get(f"{url}/health/") as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    async def _health_loop(self):
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            while True:
+                results = await asyncio.gather(*(self._check(session, url) for url in self.urls))
+                self._set_healthy({url for url, ok in zip(self.urls, results) if ok})
+                await asyncio.sleep(self.check_interval)
+
+    def get_status(self):
+        return {url: url in self.healthy for url in self.urls}
@@ -1,11 +1,21 @@
 # qos_manager.py
 
+import threading
+import zlib
+
 import numpy as np
-from collections import deque
-import random
+from collections import OrderedDict, deque
+
+# Data-rate multipliers for the RL actions: high, medium, low bandwidth allocation
+BANDWIDTH_MULTIPLIERS = (1.2, 1.0, 0.8)
+
+QOS_MODES = ("RL", "RR", "DRR")
+
+# DRR charges packets by size; packets without a packet_size count as one MTU
+DEFAULT_PACKET_COST = 1500
 
 class RLQoSManager:
-    def __init__(self, n_states=8, n_actions=3, learning_rate=0.1, gamma=0.95):
+    def __init__(self, n_states=8, n_actions=3, learning_rate=0.1, gamma=0.95, rng=None):
         self.n_states = n_states  # States based on queue length and priority
         self.n_actions = n_actions  # Actions: high, medium, low bandwidth allocation
         self.q_table = np.zeros((n_states, n_actions))
@@ -14,6 +24,12 @@ class RLQoSManager:
         self.epsilon = 1.0
         self.epsilon_decay = 0.995
         self.epsilon_min = 0.01
+        # Own generator so seeded runs are reproducible and don't share global state
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Updates from any thread are queued as (apply, args) and applied in
+        # order by one writer at a time
+        self.pending_updates = deque()
+        self.writer_lock = threading.Lock()
         
     def get_state(self, queue_length, packet_priority, packet_delay):
     # Normalize and discretize state parameters
@@ -26,12 +42,68 @@ class RLQoSManager:
         return min(state, self.n_states - 1)  # Cap the state to max allowed
 
     
-    def get_action(self, state):
-        if random.random() < self.epsilon:
-            return random.randint(0, self.n_actions - 1)
+    def get_states(self, queue_lengths, packet_priorities, packet_delays):
+        # Vectorized get_state
+        queue_state = np.minimum(3, queue_lengths // 5)
+        priority_state = np.minimum(1, packet_priorities)
+        delay_state = (packet_delays > 50).astype(np.int64)
+        return np.minimum(queue_state * 4 + priority_state * 2 + delay_state, self.n_states - 1)
+
+    def get_actions(self, states, rng=None):
+        # Vectorized epsilon-greedy choice, all at the current epsilon
+        rng = rng if rng is not None else self.rng
+        actions = np.argmax(self.q_table[states], axis=1)
+        explore = rng.random(len(states)) < self.epsilon
+        actions[explore] = rng.integers(self.n_actions, size=int(explore.sum()))
+        return actions
+
+    def get_action(self, state, rng=None):
+        # Callers on other threads pass their own generator
+        rng = rng if rng is not None else self.rng
+        if rng.random() < self.epsilon:
+            return int(rng.integers(self.n_actions))
         return np.argmax(self.q_table[state])
     
     def update(self, state, action, reward, next_state):
+        self._enqueue(self._apply_update, (state, action, reward, next_state))
+
+    def update_batch(self, states, actions, rewards, next_states):
+        self._enqueue(self._apply_batch, (states, actions, rewards, next_states))
+
+    def _enqueue(self, apply, args):
+        # Never blocks: if another thread is writing, it applies this update too
+        self.pending_updates.append((apply, args))
+        while self.pending_updates and self.writer_lock.acquire(blocking=False):
+            try:
+                while self.pending_updates:
+                    apply, args = self.pending_updates.popleft()
+                    apply(*args)
+            finally:
+                self.writer_lock.release()
+
+    def _apply_batch(self, states, actions, rewards, next_states):
+        # Every target's next-state maximum comes from the table as it was
+        # before the batch. Updates to the same (state, action) are then
+        # applied in batch order, which after k of them gives
+        #   Q = (1 - lr)^k * Q + sum_j lr * (1 - lr)^(k - 1 - j) * target_j
+        targets = rewards + self.gamma * self.q_table[next_states].max(axis=1)
+        keys = states * self.n_actions + actions
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        counts = np.bincount(keys, minlength=self.q_table.size)
+        positions = np.arange(len(keys)) - (np.cumsum(counts) - counts)[sorted_keys]
+        keep = 1 - self.lr
+        weights = self.lr * keep ** (counts[sorted_keys] - 1 - positions)
+        contributions = np.bincount(sorted_keys, weights=weights * targets[order], minlength=self.q_table.size)
+        q_values = self.q_table.reshape(-1)
+        hit = counts > 0
+        q_values[hit] = keep ** counts[hit] * q_values[hit] + contributions[hit]
+
+        # Same decay as one update() per decision
+        if self.epsilon > self.epsilon_min:
+            self.epsilon = max(self.epsilon * self.epsilon_decay ** len(keys), self.epsilon_min)
+
+    def _apply_update(self, state, action, reward, next_state):
         old_value = self.q_table[state, action]
         next_max = np.max(self.q_table[next_state])
         new_value = (1 - self.lr) * old_value + self.lr * (reward + self.gamma * next_max)
@@ -42,108 +114,306 @@ class RLQoSManager:
 
 class RoundRobinQoS:
     def __init__(self, time_slice=5):
-        self.queue = deque()
+        # Rotation queue, next stream to serve first. Serving a stream moves
+        # it to the back, so adding, removing and advancing are all O(1) and
+        # a removal never changes the order of the others.
+        self.streams = OrderedDict()
         self.time_slice = time_slice
         self.current_slice = 0
         self.current_stream = None
+        # The rotation is one shared order, so it has its own small lock
+        self.lock = threading.Lock()
     
     def add_stream(self, stream_id):
-        if stream_id not in self.queue:
-            self.queue.append(stream_id)
+        with self.lock:
+            self._add(stream_id)
+
+    def _add(self, stream_id):
+        # New streams join at the back of the current round
+        if stream_id not in self.streams:
+            self.streams[stream_id] = None
     
     def remove_stream(self, stream_id):
-        if stream_id in self.queue:
-            self.queue.remove(stream_id)
-            if self.current_stream == stream_id:
-                self.current_stream = None
-                self.current_slice = 0
+        with self.lock:
+            self._remove(stream_id)
+
+    def _remove(self, stream_id):
+        if stream_id not in self.streams:
+            return
+        del self.streams[stream_id]
+        if self.current_stream == stream_id:
+            self.current_stream = None
+            self.current_slice = 0
+
+    def _advance(self):
+        self.current_stream = next(iter(self.streams))
+        self.streams.move_to_end(self.current_stream)
     
     def get_next_stream(self):
-        if not self.queue:
-            return None
-            
-        if self.current_slice >= self.time_slice or self.current_stream is None:
-            self.current_stream = self.queue[0]
-            self.queue.rotate(-1)
-            self.current_slice = 0
-            
-        self.current_slice += 1
-        return self.current_stream
+        with self.lock:
+            if not self.streams:
+                return None
+
+            if self.current_slice >= self.time_slice or self.current_stream is None:
+                self._advance()
+                self.current_slice = 0
+
+            self.current_slice += 1
+            return self.current_stream
+
+
+class DeficitRoundRobinQoS(RoundRobinQoS):
+    """Deficit round robin over the same rotation queue.
+
+    Every processed packet's cost (its size in bytes) is charged to the
+    stream currently being served. When that stream's deficit can't cover the
+    cost, the turn passes on, and each stream that gets a turn is credited
+    quantum * weight. Heavier streams therefore hold the turn for
+    proportionally more traffic, and unused deficit carries over.
+    """
+
+    def __init__(self, quantum=5 * DEFAULT_PACKET_COST, min_weight=0.1):
+        super().__init__()
+        self.quantum = quantum
+        # Floor so a near-zero weight can't make a turn cost many rounds
+        self.min_weight = min_weight
+        self.weights = {}
+        self.deficits = {}
+
+    def add_stream(self, stream_id, weight=1.0):
+        with self.lock:
+            self._add(stream_id)
+            self.weights[stream_id] = max(weight, self.min_weight)
+            self.deficits.setdefault(stream_id, 0.0)
+
+    def set_weight(self, stream_id, weight):
+        with self.lock:
+            if stream_id in self.streams:
+                self.weights[stream_id] = max(weight, self.min_weight)
+
+    def _remove(self, stream_id):
+        super()._remove(stream_id)
+        self.weights.pop(stream_id, None)
+        self.deficits.pop(stream_id, None)
+
+    def _advance(self):
+        super()._advance()
+        self.deficits[self.current_stream] += self.quantum * self.weights[self.current_stream]
+
+    def get_next_stream(self, cost=DEFAULT_PACKET_COST):
+        with self.lock:
+            if not self.streams:
+                return None
+            if self.current_stream is None:
+                self._advance()
+            while self.deficits[self.current_stream] < cost:
+                self._advance()
+            self.deficits[self.current_stream] -= cost
+            return self.current_stream
+
+class RollingStats:
+    """Mean and variance of the last `window` values, O(1) per update.
+
+    Values live in a fixed ring buffer. The mean comes from a running sum and
+    the variance from a sliding-window Welford update. Both are recomputed
+    from the buffer each time it wraps, so rounding error can't accumulate
+    over a long run.
+    """
+
+    def __init__(self, window=1000):
+        self.values = [0.0] * window
+        self.window = window
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        if self.count < self.window:
+            self.count += 1
+            self.total += value
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.values[self.head]
+            self.total += value - old
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.window
+        if self.head == 0:
+            self._resync()
+
+    def _resync(self):
+        values = self.values[:self.count]
+        self.total = sum(values)
+        self.mean = self.total / self.count
+        self.m2 = sum((value - self.mean) ** 2 for value in values)
+
+    def average(self):
+        return self.total / self.count if self.count else 0
+
+    def variance(self):
+        return max(self.m2, 0.0) / self.count if self.count else 0
+
+
+class EWMAStats:
+    """Exponentially weighted mean and variance; O(1) memory and time."""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def add(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            increment = self.alpha * delta
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + delta * increment)
+        self.count += 1
+
+    def average(self):
+        return self.mean
+
+    def variance(self):
+        return self.var
+
 
 class QoSMetricsCollector:
-    def __init__(self):
+    """Per-stream rolling latency, throughput, loss and jitter.
+
+    mode='window' averages over the last `window` packets (RollingStats);
+    mode='ewma' weights recent packets by `alpha` (EWMAStats). Either way
+    an update and a read are O(1) and memory per stream is bounded.
+    """
+
+    FIELDS = ('latency', 'throughput', 'packet_loss', 'jitter')
+
+    def __init__(self, window=1000, mode='window', alpha=0.1):
+        if mode not in ('window', 'ewma'):
+            raise ValueError(f"Unknown metrics mode: {mode}")
+        self.window = window
+        self.mode = mode
+        self.alpha = alpha
         self.metrics = {}
-        
+
+    def _new_stats(self):
+        return RollingStats(self.window) if self.mode == 'window' else EWMAStats(self.alpha)
+
     def initialize_stream(self, stream_id):
-        self.metrics[stream_id] = {
-            'latency': [],
-            'throughput': [],
-            'packet_loss': [],
-            'jitter': [],
-            'last_packet_time': None
-        }
+        self.metrics[stream_id] = {field: self._new_stats() for field in self.FIELDS}
+        self.metrics[stream_id]['last_packet_time'] = None
     
     def update_metrics(self, stream_id, packet_data):
         if stream_id not in self.metrics:
             self.initialize_stream(stream_id)
             
         metrics = self.metrics[stream_id]
-        
-        # Update latency
-        metrics['latency'].append(packet_data['latency'])
-        
-        # Update throughput
-        metrics['throughput'].append(packet_data['data_rate'])
-        
-        # Update packet loss
-        metrics['packet_loss'].append(packet_data['packet_loss'])
+        metrics['latency'].add(packet_data['latency'])
+        metrics['throughput'].add(packet_data['data_rate'])
+        metrics['packet_loss'].add(packet_data['packet_loss'])
         
         # Calculate and update jitter
         current_time = packet_data.get('timestamp', 0)
         if metrics['last_packet_time'] is not None:
-            jitter = abs(current_time - metrics['last_packet_time'])
-            metrics['jitter'].append(jitter)
+            metrics['jitter'].add(abs(current_time - metrics['last_packet_time']))
         metrics['last_packet_time'] = current_time
     
     def get_stream_metrics(self, stream_id):
-        if stream_id not in self.metrics:
+        m = self.metrics.get(stream_id)
+        if m is None:
             return None
-            
-        m = self.metrics[stream_id]
         return {
-            'avg_latency': np.mean(m['latency']) if m['latency'] else 0,
-            'avg_throughput': np.mean(m['throughput']) if m['throughput'] else 0,
-            'avg_packet_loss': np.mean(m['packet_loss']) if m['packet_loss'] else 0,
-            'avg_jitter': np.mean(m['jitter']) if m['jitter'] else 0
+            'avg_latency': m['latency'].average(),
+            'avg_throughput': m['throughput'].average(),
+            'avg_packet_loss': m['packet_loss'].average(),
+            'avg_jitter': m['jitter'].average(),
+            'latency_std': m['latency'].variance() ** 0.5
         }
     
     def clear_metrics(self, stream_id):
         if stream_id in self.metrics:
             del self.metrics[stream_id]
 
+class _StreamShard:
+    def __init__(self, rng, metrics_window, metrics_mode):
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.metrics = QoSMetricsCollector(metrics_window, metrics_mode)
+        self.rng = rng
+
+
 class QoSManager:
-    def __init__(self):
-        self.rl_qos = RLQoSManager()
+    """QoS decisions for many streams, safe to call from several threads.
+
+    Per-stream state (queue, priority, metrics) is split across n_shards
+    lock-striped shards by stream id hash, so threads working on streams in
+    different shards never contend. Q-table updates go through
+    RLQoSManager's single-writer queue. Across processes, GeneratorWorkerPool
+    gives each worker its own QoSManager.
+    """
+
+    def __init__(self, rng=None, metrics_window=1000, metrics_mode='window', n_shards=16, drr_weight='priority'):
+        if drr_weight not in ('priority', 'data_rate'):
+            raise ValueError(f"Unknown DRR weight: {drr_weight}")
+        self.rl_qos = RLQoSManager(rng=rng)
         self.rr_qos = RoundRobinQoS()
-        self.metrics_collector = QoSMetricsCollector()
-        self.active_streams = {}
-        self.qos_mode = "RL"  # or "RR" for Round Robin
+        # DRR quanta follow traffic priority, or each stream's latest data_rate (Mbps)
+        self.drr_qos = DeficitRoundRobinQoS()
+        self.drr_weight = drr_weight
+        # Each shard draws exploration from its own child of the manager's generator
+        self.shards = [
+            _StreamShard(shard_rng, metrics_window, metrics_mode)
+            for shard_rng in self.rl_qos.rng.spawn(n_shards)
+        ]
+        self.qos_mode = "RL"  # or "RR" for Round Robin, "DRR" for Deficit Round Robin
+
+    def _shard(self, stream_id):
+        return self.shards[zlib.crc32(stream_id.encode()) % len(self.shards)]
+
+    def has_stream(self, stream_id):
+        shard = self._shard(stream_id)
+        with shard.lock:
+            return stream_id in shard.streams
+
+    def stream_ids(self):
+        ids = []
+        for shard in self.shards:
+            with shard.lock:
+                ids.extend(shard.streams)
+        return ids
         
     def add_stream(self, stream_id, traffic_type, user_density):
-        self.active_streams[stream_id] = {
-            'traffic_type': traffic_type,
-            'user_density': user_density,
-            'queue': deque(maxlen=100),
-            'priority': self._get_traffic_priority(traffic_type)
-        }
+        shard = self._shard(stream_id)
+        with shard.lock:
+            shard.streams[stream_id] = {
+                'traffic_type': traffic_type,
+                'user_density': user_density,
+                'queue': deque(maxlen=100),
+                'priority': self._get_traffic_priority(traffic_type)
+            }
+            shard.metrics.initialize_stream(stream_id)
         self.rr_qos.add_stream(stream_id)
-        self.metrics_collector.initialize_stream(stream_id)
+        # Data-rate weights start at 1 and follow the stream's packets
+        self.drr_qos.add_stream(
+            stream_id, self._get_traffic_priority(traffic_type) + 1 if self.drr_weight == 'priority' else 1.0
+        )
     
     def remove_stream(self, stream_id):
-        if stream_id in self.active_streams:
-            del self.active_streams[stream_id]
+        shard = self._shard(stream_id)
+        with shard.lock:
+            removed = shard.streams.pop(stream_id, None) is not None
+            shard.metrics.clear_metrics(stream_id)
+        if removed:
             self.rr_qos.remove_stream(stream_id)
-            self.metrics_collector.clear_metrics(stream_id)
+            self.drr_qos.remove_stream(stream_id)
     
     def _get_traffic_priority(self, traffic_type):
         priority_map = {
@@ -156,53 +426,141 @@ class QoSManager:
         }
         return priority_map.get(traffic_type, 1)
     
-    def process_packet(self, stream_id, packet_data):
-        if stream_id not in self.active_streams:
-            return packet_data
-            
-        stream = self.active_streams[stream_id]
-        stream['queue'].append(packet_data)
-        
+    def process_batch(self, packets):
+        """Vectorized process_packet for packets of many streams.
+
+        Each packet needs a 'stream_id'; processed packets come back in
+        input order, and packets of unknown streams are returned unchanged.
+        Queue lengths and metrics match calling process_packet on each packet
+        in turn. RL decisions use the Q-table and epsilon as they were when
+        the batch started, and the batch's Q updates are applied as described
+        in RLQoSManager._apply_batch.
+        """
+        results = list(packets)
+        groups = {}
+        for index, packet in enumerate(packets):
+            groups.setdefault(packet['stream_id'], []).append(index)
+
+        queue_lengths = np.zeros(len(packets), dtype=np.int64)
+        priorities = np.zeros(len(packets), dtype=np.int64)
+        active = np.zeros(len(packets), dtype=bool)
+        for stream_id, indexes in groups.items():
+            shard = self._shard(stream_id)
+            with shard.lock:
+                stream = shard.streams.get(stream_id)
+                if stream is None:
+                    continue
+                queue = stream['queue']
+                before = len(queue)
+                queue.extend(packets[index] for index in indexes)
+                priority = stream['priority']
+            indexes = np.array(indexes)
+            queue_lengths[indexes] = np.minimum(before + np.arange(1, len(indexes) + 1), queue.maxlen)
+            priorities[indexes] = priority
+            active[indexes] = True
+
+        rows = np.flatnonzero(active)
+        if len(rows) == 0:
+            return results
+        row_list = rows.tolist()
+        latency = np.array([packets[index]['latency'] for index in row_list], dtype=np.float64)
+        data_rate = np.array([packets[index]['data_rate'] for index in row_list], dtype=np.float64)
+        packet_loss = np.array([packets[index]['packet_loss'] for index in row_list], dtype=np.float64)
+        queue_lengths = queue_lengths[rows]
+        priorities = priorities[rows]
+
         if self.qos_mode == "RL":
-            state = self.rl_qos.get_state(
-                len(stream['queue']),
-                stream['priority'],
-                packet_data['latency']
-            )
-            action = self.rl_qos.get_action(state)
-            
-            # Apply QoS based on RL action
-            modified_packet = self._apply_rl_qos(packet_data, action)
-            
-            # Calculate reward based on QoS metrics
-            reward = self._calculate_reward(modified_packet, stream['priority'])
-            
-            # Update RL model
-            next_state = self.rl_qos.get_state(
-                len(stream['queue']),
-                stream['priority'],
-                modified_packet['latency']
-            )
-            self.rl_qos.update(state, action, reward, next_state)
-            
-        else:  # Round Robin
-            next_stream = self.rr_qos.get_next_stream()
-            modified_packet = self._apply_rr_qos(packet_data, stream_id == next_stream)
-        
-        # Collect metrics
-        self.metrics_collector.update_metrics(stream_id, modified_packet)
+            states = self.rl_qos.get_states(queue_lengths, priorities, latency)
+            actions = self.rl_qos.get_actions(states)
+            multipliers = np.array(BANDWIDTH_MULTIPLIERS)[actions]
+            data_rate *= multipliers
+            latency *= 2 - multipliers
+            rewards = self._calculate_rewards(latency, data_rate, packet_loss, priorities)
+            next_states = self.rl_qos.get_states(queue_lengths, priorities, latency)
+            self.rl_qos.update_batch(states, actions, rewards, next_states)
+        else:  # Round Robin / Deficit Round Robin
+            is_current = np.array([
+                self._next_stream(packets[index]['stream_id'], packets[index]) == packets[index]['stream_id']
+                for index in row_list
+            ])
+            data_rate *= np.where(is_current, 1.2, 0.8)
+            latency *= np.where(is_current, 0.8, 1.2)
+
+        for index, rate, delay in zip(row_list, data_rate.tolist(), latency.tolist()):
+            modified_packet = packets[index].copy()
+            modified_packet['data_rate'] = rate
+            modified_packet['latency'] = delay
+            results[index] = modified_packet
+
+        # Collect metrics, one shard lock per stream
+        for stream_id, indexes in groups.items():
+            shard = self._shard(stream_id)
+            with shard.lock:
+                if stream_id in shard.streams:
+                    for index in indexes:
+                        shard.metrics.update_metrics(stream_id, results[index])
+        return results
+
+    def process_packet(self, stream_id, packet_data):
+        shard = self._shard(stream_id)
+        update = None
+        with shard.lock:
+            stream = shard.streams.get(stream_id)
+            if stream is None:
+                return packet_data
+
+            stream['queue'].append(packet_data)
+
+            if self.qos_mode == "RL":
+                state = self.rl_qos.get_state(
+                    len(stream['queue']),
+                    stream['priority'],
+                    packet_data['latency']
+                )
+                action = self.rl_qos.get_action(state, shard.rng)
+
+                # Apply QoS based on RL action
+                modified_packet = self._apply_rl_qos(packet_data, action)
+
+                # Calculate reward based on QoS metrics
+                reward = self._calculate_reward(modified_packet, stream['priority'])
+
+                next_state = self.rl_qos.get_state(
+                    len(stream['queue']),
+                    stream['priority'],
+                    modified_packet['latency']
+                )
+                update = (state, action, reward, next_state)
+
+            else:  # Round Robin / Deficit Round Robin
+                next_stream = self._next_stream(stream_id, packet_data)
+                modified_packet = self._apply_rr_qos(packet_data, stream_id == next_stream)
+
+            # Collect metrics
+            shard.metrics.update_metrics(stream_id, modified_packet)
+
+        # Update RL model outside the shard lock
+        if update is not None:
+            self.rl_qos.update(*update)
         return modified_packet
     
+    def _next_stream(self, stream_id, packet_data):
+        # Stream whose turn it is when this packet is processed (RR and DRR modes)
+        if self.qos_mode != "DRR":
+            return self.rr_qos.get_next_stream()
+        if self.drr_weight == 'data_rate':
+            self.drr_qos.set_weight(stream_id, packet_data['data_rate'])
+        return self.drr_qos.get_next_stream(packet_data.get('packet_size', DEFAULT_PACKET_COST))
+
     def _apply_rl_qos(self, packet_data, action):
         # Modify packet characteristics based on RL action
-        bandwidth_multipliers = [1.2, 1.0, 0.8]  # high, medium, low
         modified_packet = packet_data.copy()
         
         # Adjust data rate based on action
-        modified_packet['data_rate'] *= bandwidth_multipliers[action]
+        modified_packet['data_rate'] *= BANDWIDTH_MULTIPLIERS[action]
         
         # Adjust latency inversely to bandwidth allocation
-        modified_packet['latency'] *= (2 - bandwidth_multipliers[action])
+        modified_packet['latency'] *= (2 - BANDWIDTH_MULTIPLIERS[action])
         
         return modified_packet
     
@@ -229,9 +587,20 @@ class QoSManager:
         priority_multiplier = 1 + (priority * 0.5)
         return priority_multiplier * (latency_score + throughput_score + packet_loss_score) / 3
     
+    def _calculate_rewards(self, latency, data_rate, packet_loss, priorities):
+        # Vectorized _calculate_reward
+        latency_score = np.maximum(0, 1 - latency / 100)
+        throughput_score = np.minimum(1, data_rate / 50)
+        packet_loss_score = np.maximum(0, 1 - packet_loss / 5)
+        priority_multiplier = 1 + (priorities * 0.5)
+        return priority_multiplier * (latency_score + throughput_score + packet_loss_score) / 3
+
     def get_metrics(self, stream_id):
-        return self.metrics_collector.get_stream_metrics(stream_id)
+        shard = self._shard(stream_id)
+        with shard.lock:
+            return shard.metrics.get_stream_metrics(stream_id)
     
     def switch_qos_mode(self):
-        self.qos_mode = "RR" if self.qos_mode == "RL" else "RL"
+        # Cycles RL -> RR -> DRR -> RL
+        self.qos_mode = QOS_MODES[(QOS_MODES.index(self.qos_mode) + 1) % len(QOS_MODES)]
         return self.qos_mode
\ No newline at end of file
@@ -0,0 +1,38 @@
+# random_streams.py
+
+import threading
+
+import numpy as np
+
+
+class RandomStreams:
+    """Hands out independent NumPy generators derived from one run seed.
+
+    Children are spawned from a SeedSequence in request order, so a run
+    that creates its streams in the same order with the same seed draws the
+    same numbers. seed=None takes fresh OS entropy. Every stream gets its own
+    Generator, so nothing contends on a shared RNG.
+    """
+
+    def __init__(self, seed=None):
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.lock = threading.Lock()
+
+    @property
+    def seed(self):
+        return self.seed_sequence.entropy
+
+    def spawn_seed(self):
+        # A picklable child SeedSequence, e.g. to hand to a worker process
+        with self.lock:
+            return self.seed_sequence.spawn(1)[0]
+
+    def spawn(self):
+        return np.random.default_rng(self.spawn_seed())
+
+
+def stream_generators(seed, count):
+    # Independent generators for the parts of one stream (packets, arrivals, sizes...)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(count)]
@@ -11,17 +11,30 @@ class NetworkTrafficApp {
     }
 
     initializeSocketListeners() {
-        this.socket.on("packet_status", (data) => {
-            this.updateStatusLog(data);
-            this.updateStreamCard(data);
-            if (data.metrics) {
-                this.updateMetrics(data.stream_id, data.metrics);
-                this.updateCharts(data.stream_id, data.metrics);
-            }
-            if (data.qos_mode) {
-                this.updateQoSMode(data.qos_mode);
+        // The server forgets a client's rooms when it disconnects, so
+        // subscriptions are renewed on every (re)connect
+        this.socket.on("connect", () => {
+            if (this.activeStreams.size > 0) {
+                this.socket.emit("subscribe", { streams: Array.from(this.activeStreams.keys()) });
             }
         });
+        this.socket.on("packet_status", (data) => this.handlePacketStatus(data));
+        // Server coalesces per-stream updates and sends them in batched frames
+        this.socket.on("packet_status_batch", (frame) => {
+            frame.updates.forEach((data) => this.handlePacketStatus(data));
+        });
+    }
+
+    handlePacketStatus(data) {
+        this.updateStatusLog(data);
+        this.updateStreamCard(data);
+        if (data.metrics) {
+            this.updateMetrics(data.stream_id, data.metrics);
+            this.updateCharts(data.stream_id, data.metrics);
+        }
+        if (data.qos_mode) {
+            this.updateQoSMode(data.qos_mode);
+        }
     }
 
     initializeEventListeners() {
@@ -91,6 +104,8 @@ class NetworkTrafficApp {
             const result = await response.json();
             
             if (result.status === "stream_started") {
+                // Only receive updates for the streams this dashboard shows
+                this.socket.emit("subscribe", { streams: [result.stream_id] });
                 const streamCard = this.createStreamCard(result.stream_id, trafficType, userDensity);
                 document.getElementById("active_streams").appendChild(streamCard);
                 this.initializeChart(result.stream_id);
@@ -270,6 +285,7 @@ class NetworkTrafficApp {
     async stopAllStreams() {
         try {
             await fetch("/stop_all_streams", { method: "POST" });
+            this.socket.emit("unsubscribe", { streams: Array.from(this.activeStreams.keys()) });
             document.getElementById("active_streams").innerHTML = '';
             this.activeStreams.clear();
             this.addStatus("All streams stopped");
@@ -289,6 +305,7 @@ class NetworkTrafficApp {
                     body: JSON.stringify({ stream_id: streamId })
                 });
                 stopButton.closest('.bg-gray-100').remove();
+                this.socket.emit("unsubscribe", { streams: [streamId] });
                 this.activeStreams.delete(streamId);
                 this.addStatus(`Stopped stream ${streamId.slice(0, 8)}...`);
             } catch (error) {
@@ -0,0 +1,149 @@
+# stream_runner.py
+
+import asyncio
+import time
+
+from latency_histogram import LatencyTracker
+from pacing import PacingScheduler
+from random_streams import stream_generators
+from traffic_models import ConstantSize, create_arrival_model, create_size_model
+
+DEFAULT_PACKET_RATE = 1.0  # packets per second
+
+
+class StreamRunner:
+    """Generate -> QoS -> post loop for a single traffic stream.
+
+    Everything a stream needs is injected, so the same loop runs inside the
+    Flask process and inside generator worker processes; status updates go
+    through the publish(event, payload) callback.
+
+    In closed-loop mode each send waits for its response. In open-loop mode
+    sends are fired on schedule regardless of what is outstanding (up to
+    max_outstanding per stream). Either way, latency is measured from the
+    packet's intended send time, not from when it actually went out, so a
+    slow processor shows up in the histograms instead of silently lowering
+    the offered load (coordinated omission).
+    """
+
+    def __init__(self, qos_manager, http_pool, packet_generator, processor_url, publish,
+                 pacing_scheduler=None, packet_coalescer=None, batch_size=64, recorder=None,
+                 open_loop=False, max_outstanding=1000, processor_cluster=None):
+        self.qos_manager = qos_manager
+        self.http_pool = http_pool
+        self.packet_generator = packet_generator
+        self.processor_url = processor_url
+        self.publish = publish
+        self.pacing_scheduler = pacing_scheduler if pacing_scheduler is not None else PacingScheduler()
+        self.packet_coalescer = packet_coalescer
+        self.batch_size = batch_size
+        self.recorder = recorder
+        self.open_loop = open_loop
+        self.max_outstanding = max_outstanding
+        # Optional ProcessorCluster: routes each stream to one of several processors
+        self.processor_cluster = processor_cluster
+        self.latency_tracker = LatencyTracker()
+
+    def processor_url_for(self, stream_id):
+        if self.processor_cluster is not None:
+            return self.processor_cluster.url_for(stream_id)
+        return self.processor_url
+
+    async def post_packet(self, packet):
+        # Returns None on success, otherwise the processor's error text
+        processor_url = self.processor_url_for(packet["stream_id"])
+        if self.packet_coalescer is not None:
+            result = await self.packet_coalescer.submit(packet, f"{processor_url}/process_batch/")
+            return result.get("error")
+        # The body is not used, so skip server-side ISO formatting
+        async with self.http_pool.post(f"{processor_url}/process_packet/?time_format=ns", json=packet) as response:
+            if response.status == 200:
+                return None
+            return await response.text()
+
+    async def send(self, stream_id, traffic_type, processed_data, intended_at):
+        loop = asyncio.get_running_loop()
+        # Wall-clock send time lets the processor measure one-way delay and jitter
+        processed_data["sent_at_ns"] = time.time_ns()
+        try:
+            error = await self.post_packet(processed_data)
+            if error is None:
+                self.latency_tracker.record(stream_id, traffic_type, loop.time() - intended_at)
+
+                # Get QoS metrics
+                metrics = self.qos_manager.get_metrics(stream_id)
+                
+                self.publish("packet_status", {
+                    "status": "sent",
+                    "data": processed_data,
+                    "metrics": metrics,
+                    "stream_id": stream_id,
+                    "qos_mode": self.qos_manager.qos_mode
+                })
+            else:
+                self.publish("packet_status", {
+                    "status": "error",
+                    "data": error,
+                    "stream_id": stream_id
+                })
+        except Exception as e:
+            self.publish("packet_status", {
+                "status": "exception",
+                "data": str(e),
+                "stream_id": stream_id
+            })
+
+    async def run(self, user_density, traffic_type, stream_id, is_active,
+                  packet_rate=DEFAULT_PACKET_RATE, arrival_model=None, seed=None, packet_size=None):
+        loop = asyncio.get_running_loop()
+        if self.processor_cluster is not None:
+            self.processor_cluster.ensure_health_checks()
+        # seed (int or SeedSequence) makes this stream's packets and timing reproducible
+        packet_rng, arrival_rng, size_rng = stream_generators(seed, 3)
+        # Inter-arrival times and packet sizes follow the traffic type's models,
+        # unless the client fixed the packet size its rate was derived from
+        if packet_size is not None:
+            size_model = ConstantSize(packet_size, size_rng)
+        else:
+            size_model = create_size_model(traffic_type, size_rng)
+        arrivals = create_arrival_model(traffic_type, packet_rate, arrival_model, arrival_rng)
+        packets = self.packet_generator.stream(
+            user_density, traffic_type, stream_id, self.batch_size, size_model, packet_rng
+        )
+        pacer = self.pacing_scheduler.stream_pacer(packet_rate, arrivals)
+        # send task -> intended send time, in send order
+        outstanding = {}
+        sequence = 0
+        try:
+            while is_active():
+                intended_at = await pacer.wait()
+                raw_data = next(packets)
+                if self.recorder is not None:
+                    self.recorder.record(raw_data, user_density)
+                
+                # Apply QoS management
+                processed_data = self.qos_manager.process_packet(stream_id, raw_data)
+                # Numbered before the open-loop limit, so dropped sends show up as gaps
+                sequence += 1
+                processed_data["seq"] = sequence
+                
+                if not self.open_loop:
+                    await self.send(stream_id, traffic_type, processed_data, intended_at)
+                elif len(outstanding) >= self.max_outstanding:
+                    # A dropped send would have queued behind the oldest one
+                    # still outstanding, so it is recorded as at least that late
+                    oldest = next(iter(outstanding.values()), intended_at)
+                    self.latency_tracker.record(stream_id, traffic_type, loop.time() - oldest)
+                    self.publish("packet_status", {
+                        "status": "dropped",
+                        "data": f"{len(outstanding)} requests outstanding",
+                        "stream_id": stream_id
+                    })
+                else:
+                    task = loop.create_task(self.send(stream_id, traffic_type, processed_data, intended_at))
+                    outstanding[task] = intended_at
+                    task.add_done_callback(outstanding.pop)
+        finally:
+            for task in list(outstanding):
+                task.cancel()
+            self.latency_tracker.remove(stream_id)
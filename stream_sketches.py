@@ -0,0 +1,60 @@
+# stream_sketches.py
+
+from latency_histogram import LatencyHistogram
+
+# field -> (histogram settings, summary name). Values are recorded in integer
+# units 1000x finer than reported (us for ms, kbps for Mbps), so
+# LatencyHistogram.summary()'s /1000 gives the reported unit. Ranges are
+# kept to what the fields can plausibly reach (10 Gbps, 10 s gaps); larger
+# values are clamped to the maximum.
+SKETCH_FIELDS = {
+    'latency': (dict(max_value_us=60_000_000), 'latency_ms'),
+    'data_rate': (dict(max_value_us=10_000_000), 'data_rate_mbps'),
+    'inter_arrival': (dict(max_value_us=10_000_000), 'inter_arrival_ms'),
+    'one_way_delay': (dict(max_value_us=60_000_000), 'one_way_delay_ms'),
+}
+
+
+class StreamSketches:
+    """Fixed-size quantile sketches for one stream (or a merged group).
+
+    One HDR histogram per field, so memory does not depend on how long the
+    stream runs, and sketches from different workers or runs merge by adding
+    counts.
+    """
+
+    def __init__(self):
+        self.histograms = {field: LatencyHistogram(**settings) for field, (settings, _) in SKETCH_FIELDS.items()}
+
+    @property
+    def nbytes(self):
+        return sum(histogram.counts.nbytes for histogram in self.histograms.values())
+
+    def record(self, packet_data, inter_arrival_ns=None, one_way_delay_ns=None):
+        self.histograms['latency'].record(packet_data.get('latency', 0) * 1000)
+        self.histograms['data_rate'].record(packet_data.get('data_rate', 0) * 1000)
+        if inter_arrival_ns is not None:
+            self.histograms['inter_arrival'].record(inter_arrival_ns // 1000)
+        if one_way_delay_ns is not None:
+            self.histograms['one_way_delay'].record(one_way_delay_ns // 1000)
+
+    def merge(self, other):
+        for field, histogram in self.histograms.items():
+            histogram.merge(other.histograms[field])
+        return self
+
+    def copy(self):
+        return StreamSketches().merge(self)
+
+    def summary(self):
+        return {name: self.histograms[field].summary() for field, (_, name) in SKETCH_FIELDS.items()}
+
+    def to_sparse(self):
+        return {field: histogram.to_sparse() for field, histogram in self.histograms.items()}
+
+    @classmethod
+    def from_sparse(cls, data):
+        sketches = cls()
+        for field, (settings, _) in SKETCH_FIELDS.items():
+            sketches.histograms[field] = LatencyHistogram.from_sparse(data[field], **settings)
+        return sketches
@@ -0,0 +1,175 @@
+# telemetry.py
+
+import threading
+
+AGGREGATES = ("traffic_type", "qos_mode", "latency")
+
+
+def subscription_rooms(data):
+    # Socket.IO room names for a dashboard's subscribe/unsubscribe request
+    rooms = [f"stream:{stream_id}" for stream_id in data.get("streams", [])]
+    rooms += [f"traffic_type:{traffic_type}" for traffic_type in data.get("traffic_types", [])]
+    rooms += [f"aggregate:{name}" for name in data.get("aggregates", []) if name in AGGREGATES]
+    return rooms
+
+
+class SubscriptionRegistry:
+    """Tracks which rooms have at least one subscribed client.
+
+    The emitter checks this before building a frame, so nothing is
+    serialized for streams or aggregates nobody is watching.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rooms = {}
+
+    def add(self, sid, room):
+        with self.lock:
+            self.rooms.setdefault(room, set()).add(sid)
+
+    def remove(self, sid, room):
+        with self.lock:
+            members = self.rooms.get(room)
+            if members is not None:
+                members.discard(sid)
+                if not members:
+                    del self.rooms[room]
+
+    def remove_client(self, sid):
+        with self.lock:
+            for room in list(self.rooms):
+                self.rooms[room].discard(sid)
+                if not self.rooms[room]:
+                    del self.rooms[room]
+
+    def has_subscribers(self, room):
+        return room in self.rooms
+
+
+def _traffic_type(payload):
+    data = payload.get("data")
+    return data.get("traffic_type") if isinstance(data, dict) else None
+
+
+def _aggregate(updates, key):
+    groups = {}
+    for payload in updates:
+        metrics = payload.get("metrics")
+        group = payload.get("qos_mode") if key == "qos_mode" else _traffic_type(payload)
+        if not metrics or group is None:
+            continue
+        entry = groups.setdefault(group, {"streams": 0, "packets": 0, "avg_latency": 0.0,
+                                          "avg_throughput": 0.0, "avg_packet_loss": 0.0})
+        entry["streams"] += 1
+        entry["packets"] += payload.get("coalesced", 1)
+        for name in ("avg_latency", "avg_throughput", "avg_packet_loss"):
+            entry[name] += float(metrics[name])
+    for entry in groups.values():
+        for name in ("avg_latency", "avg_throughput", "avg_packet_loss"):
+            entry[name] /= entry["streams"]
+    return groups
+
+
+class TelemetryEmitter:
+    """Coalesces status events from every stream into periodic batched frames.
+
+    publish() never blocks on the network: it only writes into a bounded
+    pending map keyed by (event, stream_id). Within one window a stream's
+    updates either overwrite each other ('overwrite' keeps the latest) or
+    later ones are dropped ('drop' keeps the first). Once max_pending keys
+    are waiting, updates for new keys are dropped. flush() sends everything
+    that is pending as one frame per event name.
+
+    With a SubscriptionRegistry, frames go only to the rooms that asked for
+    them (stream:<id>, traffic_type:<type>), and the per traffic type and
+    per QoS mode aggregates are computed once per window for the
+    aggregate:* rooms.
+    """
+
+    def __init__(self, emit, window=0.25, max_pending=10000, policy='overwrite', subscriptions=None):
+        if policy not in ('overwrite', 'drop'):
+            raise ValueError(f"Unknown telemetry policy: {policy}")
+        self.emit = emit
+        self.window = window
+        self.max_pending = max_pending
+        self.policy = policy
+        self.subscriptions = subscriptions
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.dropped = 0
+
+    def publish(self, event, payload, count=1):
+        # count > 1 republishes an entry another emitter already coalesced
+        key = (event, payload.get('stream_id'))
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                if len(self.pending) >= self.max_pending:
+                    self.dropped += count
+                    return
+                self.pending[key] = [payload, count]
+                return
+            if self.policy == 'overwrite':
+                entry[0] = payload
+            else:
+                self.dropped += count
+            entry[1] += count
+
+    def add_dropped(self, count):
+        # Updates dropped upstream (e.g. by a generator worker's emitter)
+        with self.lock:
+            self.dropped += count
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            dropped, self.dropped = self.dropped, 0
+        if not pending and not dropped:
+            return
+
+        frames = {}
+        for (event, _), (payload, count) in pending.items():
+            # How many updates this entry stands for in the window
+            payload['coalesced'] = count
+            frames.setdefault(event, []).append(payload)
+
+        if self.subscriptions is None:
+            for event, updates in frames.items():
+                self.emit(f"{event}_batch", {'updates': updates, 'dropped': dropped})
+                dropped = 0
+            if dropped:
+                self.emit("telemetry_dropped", {'dropped': dropped})
+            return
+
+        delivered = False
+        for event, updates in frames.items():
+            delivered = self._emit_to_rooms(event, updates, dropped) or delivered
+        if dropped and not delivered:
+            # No frame carried the count, so every client is told directly
+            self.emit("telemetry_dropped", {'dropped': dropped})
+        for key in ("traffic_type", "qos_mode"):
+            room = f"aggregate:{key}"
+            if self.subscriptions.has_subscribers(room):
+                self.emit(f"{key}_aggregate", _aggregate(frames.get("packet_status", []), key), to=room)
+
+    def _emit_to_rooms(self, event, updates, dropped):
+        room_frames = {}
+        for payload in updates:
+            rooms = [f"stream:{payload.get('stream_id')}"]
+            traffic_type = _traffic_type(payload)
+            if traffic_type is not None:
+                rooms.append(f"traffic_type:{traffic_type}")
+            for room in rooms:
+                if self.subscriptions.has_subscribers(room):
+                    room_frames.setdefault(room, []).append(payload)
+        for room, room_updates in room_frames.items():
+            self.emit(f"{event}_batch", {'updates': room_updates, 'dropped': dropped}, to=room)
+        # Whether any frame (and so the dropped count) went out
+        return bool(room_frames)
+
+    def run(self, sleep):
+        # Long-running emitter loop; sleep is e.g. socketio.sleep
+        while True:
+            sleep(self.window)
+            self.flush()
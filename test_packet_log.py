@@ -0,0 +1,76 @@
+# test_packet_log.py
+
+import glob
+import os
+
+from packet_log import PacketLog, PacketLogReader
+
+
+def _timestamps(chunks):
+    return sorted(int(timestamp) for _, records in chunks for timestamp in records['timestamp'])
+
+
+def _fill(log, count, start=0):
+    # Three streams, interleaved; timestamps are 1000 + packet number
+    for number in range(start, start + count):
+        log.append(f"s{number % 3}", 1000 + number, number, {'latency': float(number)})
+
+
+def test_round_trip_across_segments(tmp_path):
+    # 4-record blocks and 3 blocks per segment, so 100 packets span many segments
+    log = PacketLog(str(tmp_path), block_records=4, segment_bytes=12 * 48)
+    _fill(log, 100)
+    assert len(glob.glob(os.path.join(str(tmp_path), 'segment_*.idx'))) > 2
+    reader = PacketLogReader(str(tmp_path))
+
+    on_disk = _timestamps(reader.query())
+    buffered = _timestamps(log.tail())
+    assert sorted(on_disk + buffered) == list(range(1000, 1100))
+
+    log.close()
+    chunks = list(reader.query())
+    assert _timestamps(chunks) == list(range(1000, 1100))
+    for stream_id, records in chunks:
+        assert all(f"s{number % 3}" == stream_id for number in records['sequence_number'])
+        assert list(records['latency']) == [float(number) for number in records['sequence_number']]
+
+
+def test_stream_and_time_filters(tmp_path):
+    log = PacketLog(str(tmp_path), block_records=4, segment_bytes=12 * 48)
+    _fill(log, 100)
+    log.close()
+    reader = PacketLogReader(str(tmp_path))
+
+    assert _timestamps(reader.query(start_ns=1020, end_ns=1041)) == list(range(1020, 1042))
+    assert _timestamps(reader.query(start_ns=1090)) == list(range(1090, 1100))
+    assert _timestamps(reader.query(end_ns=1005)) == list(range(1000, 1006))
+    assert _timestamps(reader.query('s1')) == list(range(1001, 1100, 3))
+    assert _timestamps(reader.query('s2', 1050, 1070)) == [t for t in range(1050, 1071) if (t - 1000) % 3 == 2]
+    assert list(reader.query('missing')) == []
+
+
+def test_tail_filters_and_aged_flush(tmp_path):
+    log = PacketLog(str(tmp_path), block_records=8)
+    _fill(log, 10)
+    # s0 holds 1000, 1003, 1006, 1009 in its buffer
+    assert _timestamps(log.tail('s0')) == [1000, 1003, 1006, 1009]
+    assert _timestamps(log.tail('s0', start_ns=1004, end_ns=1008)) == [1006]
+
+    reader = PacketLogReader(str(tmp_path))
+    # Only buffers whose oldest packet is at least 5 ns old (s0's) are written
+    log.flush(max_age_ns=5, now_ns=1005)
+    assert _timestamps(reader.query()) == [1000, 1003, 1006, 1009]
+    assert _timestamps(log.tail()) == [1001, 1002, 1004, 1005, 1007, 1008]
+
+
+def test_high_water_leaves_later_blocks_to_the_tail(tmp_path):
+    log = PacketLog(str(tmp_path), block_records=4, segment_bytes=12 * 48)
+    _fill(log, 30)
+    # A reader that took this tail must not also read blocks written after it
+    high_water = log.high_water()
+    tail = _timestamps(log.tail())
+    _fill(log, 70, start=30)
+    reader = PacketLogReader(str(tmp_path))
+
+    on_disk = _timestamps(reader.read_blocks(reader.blocks(high_water=[high_water])))
+    assert sorted(on_disk + tail) == list(range(1000, 1030))
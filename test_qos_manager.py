@@ -0,0 +1,82 @@
+# test_qos_manager.py
+
+import numpy as np
+
+from qos_manager import QoSManager, RLQoSManager
+
+
+def _packet(stream_id, rng):
+    return {
+        'stream_id': stream_id,
+        'latency': float(rng.uniform(0, 100)),
+        'data_rate': float(rng.uniform(0.1, 50)),
+        'packet_loss': float(rng.uniform(0, 0.05))
+    }
+
+
+def test_apply_batch_matches_sequential_updates_with_frozen_maxima():
+    rng = np.random.default_rng(1)
+    batch = RLQoSManager(rng=np.random.default_rng(0))
+    batch.q_table[:] = rng.normal(size=batch.q_table.shape)
+    sequential = RLQoSManager(rng=np.random.default_rng(0))
+    sequential.q_table[:] = batch.q_table
+
+    # Repeated (state, action) pairs, so updates compound within the batch
+    size = 500
+    states = rng.integers(batch.n_states, size=size)
+    actions = rng.integers(batch.n_actions, size=size)
+    rewards = rng.normal(size=size)
+    next_states = rng.integers(batch.n_states, size=size)
+
+    frozen_maxima = sequential.q_table.max(axis=1)
+    for state, action, reward, next_state in zip(states, actions, rewards, next_states):
+        target = reward + sequential.gamma * frozen_maxima[next_state]
+        sequential.q_table[state, action] = (1 - sequential.lr) * sequential.q_table[state, action] + sequential.lr * target
+        if sequential.epsilon > sequential.epsilon_min:
+            sequential.epsilon *= sequential.epsilon_decay
+
+    batch.update_batch(states, actions, rewards, next_states)
+
+    np.testing.assert_allclose(batch.q_table, sequential.q_table, rtol=1e-9, atol=1e-12)
+    assert np.isclose(batch.epsilon, max(sequential.epsilon, batch.epsilon_min))
+
+
+def test_process_batch_queue_lengths_match_process_packet():
+    rng = np.random.default_rng(2)
+    # More packets per stream than a queue holds, to cover the maxlen cap
+    packets = [_packet(f"stream-{index % 3}", rng) for index in range(400)]
+    packets.append(_packet("unknown", rng))
+
+    managers = [QoSManager(rng=np.random.default_rng(0)) for _ in range(2)]
+    for manager in managers:
+        for stream_id in ("stream-0", "stream-1", "stream-2"):
+            manager.add_stream(stream_id, "YouTube", "low")
+    sequential, batched = managers
+
+    # Queue length each packet's state was computed from
+    sequential_lengths = []
+    get_state = sequential.rl_qos.get_state
+    def record_state(queue_length, *args):
+        sequential_lengths.append(queue_length)
+        return get_state(queue_length, *args)
+    sequential.rl_qos.get_state = record_state
+    batched_lengths = []
+    get_states = batched.rl_qos.get_states
+    def record_states(queue_lengths, *args):
+        batched_lengths.append(queue_lengths.tolist())
+        return get_states(queue_lengths, *args)
+    batched.rl_qos.get_states = record_states
+
+    for packet in packets:
+        sequential.process_packet(packet['stream_id'], packet)
+    results = batched.process_batch(packets)
+
+    # get_state runs twice per packet (state and next state), get_states twice per batch
+    assert sequential_lengths[::2] == batched_lengths[0]
+    assert max(batched_lengths[0]) == 100
+    for stream_id in ("stream-0", "stream-1", "stream-2"):
+        assert (
+            len(sequential._shard(stream_id).streams[stream_id]['queue'])
+            == len(batched._shard(stream_id).streams[stream_id]['queue'])
+        )
+    assert results[-1] is packets[-1]
@@ -0,0 +1,18 @@
+# timestamps.py
+
+import datetime
+
+# Internal timekeeping uses integer nanoseconds (time.time_ns / time.monotonic_ns);
+# these helpers turn them into strings only at the API boundary.
+
+
+def ns_to_datetime(ns):
+    return datetime.datetime.fromtimestamp(ns / 1e9)
+
+
+def ns_to_iso(ns):
+    return ns_to_datetime(ns).isoformat()
+
+
+def format_duration_ns(ns):
+    return str(datetime.timedelta(microseconds=ns // 1000))
@@ -0,0 +1,107 @@
+# traffic_engine.py
+
+import asyncio
+import logging
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class _EventLoopWorker:
+    def __init__(self, name, on_stream_failed=None):
+        self.loop = asyncio.new_event_loop()
+        self.tasks = {}
+        self.on_stream_failed = on_stream_failed
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _create_task(self, stream_id, coro):
+        task = self.loop.create_task(coro)
+        self.tasks[stream_id] = task
+        task.add_done_callback(lambda t: self._forget(stream_id, t))
+
+    def _forget(self, stream_id, task):
+        # A newer task may have been registered under the same id
+        if self.tasks.get(stream_id) is task:
+            del self.tasks[stream_id]
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        logger.error(f"Stream {stream_id} failed", exc_info=error)
+        if self.on_stream_failed is not None:
+            self.on_stream_failed(stream_id, error)
+
+    def _cancel_task(self, stream_id):
+        task = self.tasks.get(stream_id)
+        if task is not None:
+            task.cancel()
+
+    def _cancel_all(self):
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+    def submit(self, stream_id, coro):
+        self.loop.call_soon_threadsafe(self._create_task, stream_id, coro)
+
+    def cancel(self, stream_id):
+        self.loop.call_soon_threadsafe(self._cancel_task, stream_id)
+
+    def cancel_all(self):
+        self.loop.call_soon_threadsafe(self._cancel_all)
+
+    def stop(self):
+        async def _shutdown():
+            # Also cancel helper tasks (timers, batch flushes) living on this loop
+            tasks = [t for t in asyncio.all_tasks(self.loop) if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class TrafficEngine:
+    """Runs every stream coroutine on a small fixed pool of long-lived event loops.
+
+    Streams are pinned to a loop by hashing their id, so adding or removing a
+    stream is just task creation or cancellation on that loop. A stream whose
+    coroutine raises is logged and reported to on_stream_failed(stream_id, error),
+    called on the loop thread.
+    """
+
+    def __init__(self, num_loops=1, on_stream_failed=None):
+        self.workers = [
+            _EventLoopWorker(f"traffic-engine-{i}", on_stream_failed) for i in range(max(1, num_loops))
+        ]
+
+    def _worker_for(self, stream_id):
+        return self.workers[zlib.crc32(stream_id.encode()) % len(self.workers)]
+
+    def loop_for(self, stream_id):
+        return self._worker_for(stream_id).loop
+
+    def start_stream(self, stream_id, coro_factory, *args):
+        # The coroutine is created here but only scheduled on the owning loop
+        self._worker_for(stream_id).submit(stream_id, coro_factory(*args))
+
+    def stop_stream(self, stream_id):
+        self._worker_for(stream_id).cancel(stream_id)
+
+    def stop_all(self):
+        for worker in self.workers:
+            worker.cancel_all()
+
+    def active_count(self):
+        return sum(len(worker.tasks) for worker in self.workers)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()
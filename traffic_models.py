@@ -0,0 +1,173 @@
+# traffic_models.py
+
+import numpy as np
+
+
+class ArrivalModel:
+    """Inter-arrival time process scaled to a mean packet rate.
+
+    Subclasses implement sample(n), returning n inter-arrival times in seconds
+    as one array; intervals() hands them out one by one, refilling a block at
+    a time so the per-packet cost stays a list lookup.
+    """
+
+    name = None
+
+    def __init__(self, packet_rate, rng=None):
+        self.packet_rate = packet_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample(self, n):
+        raise NotImplementedError
+
+    def intervals(self, block_size=256):
+        while True:
+            yield from self.sample(block_size).tolist()
+
+
+class FixedArrivals(ArrivalModel):
+    name = "fixed"
+
+    def sample(self, n):
+        return np.full(n, 1.0 / self.packet_rate)
+
+
+class PoissonArrivals(ArrivalModel):
+    name = "poisson"
+
+    def sample(self, n):
+        return self.rng.exponential(1.0 / self.packet_rate, size=n)
+
+
+class OnOffArrivals(ArrivalModel):
+    # Talkspurt/silence model: constant spacing while ON, exponential OFF gaps
+    name = "on_off"
+
+    def __init__(self, packet_rate, rng=None, mean_on=1.0, mean_off=1.35):
+        super().__init__(packet_rate, rng)
+        # Below one packet per ON+OFF cycle, stretch both periods (same ON/OFF
+        # ratio) so every ON period still holds at least one packet
+        stretch = max(1.0, 1.0 / (packet_rate * (mean_on + mean_off)))
+        mean_on *= stretch
+        self.mean_off = mean_off * stretch
+        # Peak rate during ON periods that keeps the long-run mean at packet_rate
+        peak_rate = packet_rate * (mean_on + self.mean_off) / mean_on
+        self.on_interval = 1.0 / peak_rate
+        self.end_probability = self.on_interval / mean_on
+
+    def sample(self, n):
+        ends_on_period = self.rng.random(n) < self.end_probability
+        off_gaps = self.rng.exponential(self.mean_off, size=n)
+        return self.on_interval + ends_on_period * off_gaps
+
+
+class ParetoBurstArrivals(ArrivalModel):
+    # Back-to-back bursts separated by heavy-tailed idle gaps
+    name = "pareto_burst"
+
+    def __init__(self, packet_rate, rng=None, mean_burst_size=20, shape=1.5, burst_spacing=0.1):
+        super().__init__(packet_rate, rng)
+        self.shape = shape
+        self.burst_start_probability = 1.0 / mean_burst_size
+        self.intra_interval = burst_spacing / packet_rate
+        mean_idle = (1.0 / packet_rate - self.intra_interval) * mean_burst_size
+        self.idle_scale = mean_idle * (shape - 1) / shape
+
+    def sample(self, n):
+        starts_burst = self.rng.random(n) < self.burst_start_probability
+        idle_gaps = (self.rng.pareto(self.shape, size=n) + 1) * self.idle_scale
+        return self.intra_interval + starts_burst * idle_gaps
+
+
+class MMPPArrivals(ArrivalModel):
+    # Two-state Markov-modulated Poisson process (busy/quiet browsing)
+    name = "mmpp"
+
+    def __init__(self, packet_rate, rng=None, burst_ratio=10.0, switch_probability=0.05):
+        super().__init__(packet_rate, rng)
+        self.switch_probability = switch_probability
+        # Both states are visited equally often per packet, so pick the rates
+        # whose mean inter-arrival time matches packet_rate
+        low_rate = packet_rate * (1 + 1 / burst_ratio) / 2
+        self.rates = np.array([low_rate, low_rate * burst_ratio])
+        self.state = 0
+
+    def sample(self, n):
+        switches = self.rng.random(n) < self.switch_probability
+        states = (self.state + np.cumsum(switches)) % 2
+        self.state = int(states[-1])
+        return self.rng.exponential(1.0, size=n) / self.rates[states]
+
+
+class SizeModel:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample(self, n):
+        raise NotImplementedError
+
+
+class ConstantSize(SizeModel):
+    def __init__(self, size, rng=None):
+        super().__init__(rng)
+        self.size = size
+
+    def sample(self, n):
+        return np.full(n, self.size, dtype=np.int64)
+
+
+class NormalSize(SizeModel):
+    def __init__(self, mean, std, minimum=40, maximum=1500, rng=None):
+        super().__init__(rng)
+        self.mean = mean
+        self.std = std
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def sample(self, n):
+        sizes = self.rng.normal(self.mean, self.std, size=n)
+        return np.clip(sizes, self.minimum, self.maximum).astype(np.int64)
+
+
+class BimodalSize(SizeModel):
+    # Mix of small control/ACK-sized packets and full-MTU payload packets
+    def __init__(self, small=64, large=1500, large_fraction=0.6, rng=None):
+        super().__init__(rng)
+        self.small = small
+        self.large = large
+        self.large_fraction = large_fraction
+
+    def sample(self, n):
+        return np.where(self.rng.random(n) < self.large_fraction, self.large, self.small).astype(np.int64)
+
+
+ARRIVAL_MODELS = {
+    model.name: model
+    for model in (FixedArrivals, PoissonArrivals, OnOffArrivals, ParetoBurstArrivals, MMPPArrivals)
+}
+
+# Default (arrival model, size model) for each traffic type
+TRAFFIC_MODELS = {
+    "Text Message": (PoissonArrivals, lambda rng: NormalSize(200, 80, rng=rng)),
+    "WhatsApp": (PoissonArrivals, lambda rng: NormalSize(400, 200, rng=rng)),
+    "Voice Call": (OnOffArrivals, lambda rng: ConstantSize(160, rng=rng)),
+    "Voice Message": (OnOffArrivals, lambda rng: ConstantSize(160, rng=rng)),
+    "YouTube": (ParetoBurstArrivals, lambda rng: ConstantSize(1400, rng=rng)),
+    "Instagram": (MMPPArrivals, lambda rng: BimodalSize(rng=rng)),
+}
+
+
+def create_arrival_model(traffic_type, packet_rate, model_name=None, rng=None):
+    if model_name is not None:
+        if model_name not in ARRIVAL_MODELS:
+            raise ValueError(f"Unknown arrival model: {model_name}")
+        return ARRIVAL_MODELS[model_name](packet_rate, rng=rng)
+    model, _ = TRAFFIC_MODELS.get(traffic_type, (FixedArrivals, None))
+    return model(packet_rate, rng=rng)
+
+
+def create_size_model(traffic_type, rng=None):
+    if traffic_type not in TRAFFIC_MODELS:
+        return None
+    _, size_model = TRAFFIC_MODELS[traffic_type]
+    return size_model(rng)
@@ -0,0 +1,172 @@
+# traffic_trace.py
+
+import argparse
+import asyncio
+import heapq
+import json
+import threading
+import time
+
+import numpy as np
+
+from http_pool import HTTPClientPool
+from qos_manager import QoSManager
+
+
+class TraceRecorder:
+    """Append-only NDJSON trace of generated packets.
+
+    Each line is {"t": send time in epoch ns, "user_density": ..., "packet": ...}
+    holding the packet as generated, before QoS, so a replay feeds a scheduler
+    exactly the same inputs. Lines are buffered and written in chunks.
+    """
+
+    def __init__(self, path, flush_every=1000):
+        self.path = path
+        self.flush_every = flush_every
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, packet, user_density, sent_at=None):
+        line = json.dumps({
+            't': sent_at if sent_at is not None else time.time_ns(),
+            'user_density': user_density,
+            'packet': packet
+        })
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.file.flush()
+            self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+
+def _read_file(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_trace(paths):
+    # Several traces (e.g. one per generator worker) are merged by send time
+    return heapq.merge(*(_read_file(path) for path in paths), key=lambda record: record['t'])
+
+
+async def replay(paths, speed=1.0, qos_manager=None, processor_url=None, concurrency=100, batch_size=256):
+    """Feed recorded packets into a QoSManager and/or a packet processor.
+
+    speed scales the recorded inter-packet gaps (2.0 replays twice as fast);
+    speed=0 sends as fast as possible. Packets that are already due go
+    through QoSManager.process_batch together, up to batch_size at a time.
+    """
+    loop = asyncio.get_running_loop()
+    http_pool = HTTPClientPool(limit=concurrency, limit_per_host=concurrency) if processor_url else None
+    slots = asyncio.Semaphore(concurrency)
+    pending = set()
+    summary = {'packets': 0, 'errors': 0}
+
+    async def post(packet):
+        try:
+            async with http_pool.post(f"{processor_url}/process_packet/", json=packet) as response:
+                if response.status != 200:
+                    summary['errors'] += 1
+        except Exception:
+            summary['errors'] += 1
+        finally:
+            slots.release()
+
+    async def flush(records):
+        packets = [record['packet'] for record in records]
+        if qos_manager is not None:
+            for record in records:
+                stream_id = record['packet']['stream_id']
+                if not qos_manager.has_stream(stream_id):
+                    qos_manager.add_stream(stream_id, record['packet']['traffic_type'], record['user_density'])
+            packets = qos_manager.process_batch(packets)
+
+        if http_pool is not None:
+            for packet in packets:
+                await slots.acquire()
+                task = loop.create_task(post(packet))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        summary['packets'] += len(packets)
+
+    started = loop.time()
+    first_t = None
+    batch = []
+    for record in read_trace(paths):
+        if first_t is None:
+            first_t = record['t']
+        if speed > 0:
+            due = started + (record['t'] - first_t) / 1e9 / speed
+            delay = due - loop.time()
+            if delay > 0:
+                # Everything collected so far is due; send it before waiting
+                if batch:
+                    await flush(batch)
+                    batch = []
+                await asyncio.sleep(delay)
+
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    if pending:
+        await asyncio.gather(*pending)
+    if http_pool is not None:
+        await http_pool.close()
+
+    summary['duration'] = loop.time() - started
+    if qos_manager is not None:
+        summary['qos_mode'] = qos_manager.qos_mode
+        summary['metrics'] = {
+            stream_id: {name: float(value) for name, value in qos_manager.get_metrics(stream_id).items()}
+            for stream_id in qos_manager.stream_ids()
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded traffic traces')
+    parser.add_argument('traces', nargs='+', help='NDJSON trace files (merged by send time)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier, 0 = as fast as possible')
+    parser.add_argument('--qos-mode', choices=['RL', 'RR', 'DRR', 'none'], default='RL',
+                        help="scheduler to feed the packets through, or 'none' to skip QoS")
+    parser.add_argument('--processor-url', default=None, help='post packets to this processor, e.g. http://127.0.0.1:5432')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=256, help='most packets per QoSManager.process_batch call')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the RL policy, for bit-reproducible replays')
+    args = parser.parse_args()
+
+    qos_manager = None
+    if args.qos_mode != 'none':
+        qos_manager = QoSManager(rng=np.random.default_rng(args.seed))
+        qos_manager.qos_mode = args.qos_mode
+
+    summary = asyncio.run(replay(
+        args.traces, args.speed, qos_manager, args.processor_url, args.concurrency, args.batch_size
+    ))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()